@@ -1,11 +1,410 @@
 """
 根据股票走势自动判断动作类型
 """
-from typing import Optional
-from datetime import datetime, timedelta
+import asyncio
+import atexit
+import hashlib
+import logging
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import numpy as np
 import pandas as pd
 from tushare_client import TushareClient
 
+try:
+    import polars as pl  # 可选依赖，安装后可走列式引擎
+except ImportError:
+    pl = None
+
+try:
+    from numba import njit, prange  # 可选依赖，安装后批量分类走 JIT 内核
+except ImportError:
+    njit = prange = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# 分类标签按 (跌, 涨) 排列，布尔比较结果可直接作为下标，省去分支级联
+BUY_LABELS = ("跌了敢买", "涨了敢买")
+SELL_LABELS = ("跌了舍得卖", "涨了舍得卖")
+
+# 共享的分类 dtype：批量结果以 int8 编码返回时，
+# 下游用 pd.Categorical.from_codes(codes, dtype=BUY_DTYPE) 构造分类列，
+# 每个标签只占 1 字节，避免 object 列的逐行字符串分配
+BUY_DTYPE = pd.CategoricalDtype(BUY_LABELS)
+SELL_DTYPE = pd.CategoricalDtype(SELL_LABELS)
+
+
+# 日线数据磁盘缓存配置
+CACHE_DIR = os.path.join(".cache", "daily")
+CACHE_TTL_SECONDS = 86400  # 缓存1天，日线数据每个交易日最多更新一次
+
+# 已判定标签的持久化缓存：(股票, 买入日期, 买入价格) -> 标签
+# 历史交易的标签不会变，跨会话复用可以完全省掉重复的网络请求
+LABEL_CACHE_PATH = os.path.join(".cache", "labels.pkl")
+_LABEL_CACHE: Dict[Tuple[str, str, float], str] = {}
+_label_cache_dirty = False
+
+try:
+    with open(LABEL_CACHE_PATH, 'rb') as _f:
+        _LABEL_CACHE = pickle.load(_f)
+except FileNotFoundError:
+    pass
+except Exception as _e:
+    logger.debug("读取标签缓存失败: %s", _e)
+
+
+def _remember_label(stock_code: str, buy_date: str, buy_price: float, label: str):
+    """记录新判定的标签，进程退出时统一落盘"""
+    global _label_cache_dirty
+    _LABEL_CACHE[(stock_code, buy_date, buy_price)] = label
+    _label_cache_dirty = True
+
+
+@atexit.register
+def _flush_label_cache():
+    """进程退出时把新增标签写回磁盘"""
+    if not _label_cache_dirty:
+        return
+    try:
+        os.makedirs(os.path.dirname(LABEL_CACHE_PATH), exist_ok=True)
+        with open(LABEL_CACHE_PATH, 'wb') as f:
+            pickle.dump(_LABEL_CACHE, f)
+    except Exception as e:
+        logger.debug("写入标签缓存失败: %s", e)
+
+# 交易日历（已排序的 datetime64[D] 数组），首次使用时懒加载
+_TRADE_CAL: Optional[np.ndarray] = None
+
+
+def _get_trade_calendar(tushare_client: TushareClient) -> Optional[np.ndarray]:
+    """懒加载交易日历并缓存在模块级，失败时返回 None"""
+    global _TRADE_CAL
+    if _TRADE_CAL is None:
+        cal = tushare_client.get_trade_cal()
+        if cal is not None and not cal.empty:
+            _TRADE_CAL = np.sort(
+                pd.to_datetime(cal['cal_date'], format='%Y%m%d').values.astype('datetime64[D]')
+            )
+    return _TRADE_CAL
+
+
+def _classification_end_date(tushare_client: TushareClient, buy_date: str, days_to_check: int) -> str:
+    """
+    计算分类所需的日线结束日期
+
+    优先用交易日历精确定位买入日之后第 N 个交易日，只取刚好需要的行数；
+    拿不到日历时退回"日历日翻倍"的启发式（预留非交易日）
+    """
+    buy_d = np.datetime64(buy_date, 'D')
+    cal = _get_trade_calendar(tushare_client)
+    if cal is not None and cal.size:
+        i = np.searchsorted(cal, buy_d, side='left')
+        j = min(i + days_to_check, cal.size - 1)
+        if cal[j] > buy_d:
+            return str(cal[j])
+    return str(buy_d + np.timedelta64(days_to_check * 2, 'D'))
+
+
+def _daily_cache_path(stock_code: str, start_date: str, end_date: str) -> str:
+    """根据请求参数生成缓存文件路径（MD5 作为键避免特殊字符）"""
+    key = hashlib.md5(f"{stock_code}_{start_date}_{end_date}".encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"{stock_code}_{key}.pkl")
+
+
+def _load_cached_daily(path: str) -> Optional[pd.DataFrame]:
+    """读取未过期的日线缓存，不存在或已过期返回 None"""
+    try:
+        if os.path.exists(path) and time.time() - os.path.getmtime(path) < CACHE_TTL_SECONDS:
+            return pd.read_pickle(path)
+    except Exception as e:
+        logger.debug("读取日线缓存失败: %s", e)
+    return None
+
+
+def _save_cached_daily(path: str, df: pd.DataFrame):
+    """写入日线缓存"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_pickle(path)
+    except Exception as e:
+        logger.debug("写入日线缓存失败: %s", e)
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _classify_buys_kernel(closes, buys):
+        """JIT 内核：逐行分类 close 矩阵，1 = 涨了敢买，-1 = 跌了敢买"""
+        n = buys.shape[0]
+        out = np.empty(n, np.int8)
+        # 阈值对整批一次算完（SIMD 乘法），循环里只剩比较
+        hi = buys * np.float32(1.01)
+        lo = buys * np.float32(0.99)
+        for i in prange(n):
+            last = closes[i, -1]
+            if last > hi[i]:
+                out[i] = 1
+            elif last < lo[i]:
+                out[i] = -1
+            else:
+                out[i] = 1 if closes[i].mean() > buys[i] else -1
+        return out
+else:
+    def _classify_buys_kernel(closes, buys):
+        """未安装 numba 时的纯 NumPy 退化实现，逻辑与 JIT 内核一致"""
+        hi = buys * np.float32(1.01)
+        lo = buys * np.float32(0.99)
+        last = closes[:, -1]
+        codes = np.where(last > hi, 1, -1).astype(np.int8)
+        # 均值只在落入 1% 误差带的行上计算，常见情况下省掉整矩阵的归约
+        mid = (last <= hi) & (last >= lo)
+        if mid.any():
+            avg = closes[mid].mean(axis=1)
+            codes[mid] = np.where(avg > buys[mid], 1, -1)
+        return codes
+
+
+def classify_buy_action_codes(close_matrix, buy_prices) -> np.ndarray:
+    """
+    对整批交易做买入动作分类，返回 int8 类别编码
+
+    编码即 BUY_DTYPE 的 codes（0 = 跌了敢买，1 = 涨了敢买），
+    可直接喂给 pd.Categorical.from_codes(codes, dtype=BUY_DTYPE)
+
+    参数:
+        close_matrix: [N, days_to_check] 收盘价矩阵（每行一笔买入）
+        buy_prices: [N] 买入价格数组
+    """
+    # float32 精度对价格判断足够，内存带宽减半
+    closes = np.ascontiguousarray(close_matrix, dtype=np.float32)
+    buys = np.ascontiguousarray(buy_prices, dtype=np.float32)
+    return (_classify_buys_kernel(closes, buys) > 0).astype(np.int8)
+
+
+def classify_buy_actions(close_matrix, buy_prices) -> List[str]:
+    """
+    对整批交易做买入动作分类
+
+    参数:
+        close_matrix: [N, days_to_check] 收盘价矩阵（每行一笔买入）
+        buy_prices: [N] 买入价格数组
+
+    返回:
+        长度为 N 的标签列表
+    """
+    return [BUY_LABELS[c] for c in classify_buy_action_codes(close_matrix, buy_prices)]
+
+
+@lru_cache(maxsize=4096)
+def _classify_buy(close_slice: Tuple[float, ...], buy_price: float) -> str:
+    """
+    纯分类函数：根据买入后 N 个交易日的收盘价判断买入动作类型
+
+    参数全部可哈希，用 lru_cache 记忆化——重新跑同一份交易清单时
+    分类退化为一次字典查找
+    """
+    # 一次除法得到涨跌比例，替代两次阈值乘法加两次比较
+    delta = close_slice[-1] / buy_price - 1.0
+    if abs(delta) > 0.01:
+        return BUY_LABELS[bool(delta > 0)]
+    avg_close = sum(close_slice) / len(close_slice)
+    return BUY_LABELS[bool(avg_close > buy_price)]
+
+
+def _fetch_daily_cached(
+    tushare_client: TushareClient,
+    stock_code: str,
+    start_date: str,
+    end_date: str
+) -> Optional[pd.DataFrame]:
+    """优先从磁盘缓存获取日线数据，未命中才调用 tushare"""
+    path = _daily_cache_path(stock_code, start_date, end_date)
+    df = _load_cached_daily(path)
+    if df is not None:
+        return df
+    df = tushare_client.get_stock_daily(stock_code, start_date, end_date)
+    if df is not None and not df.empty:
+        _save_cached_daily(path, df)
+    return df
+
+
+def detect_buy_action_types_batch(
+    tushare_client: TushareClient,
+    items: List[Tuple[str, str, float]],
+    days_to_check: int = 5
+) -> List[Optional[str]]:
+    """
+    批量判断买入动作类型
+
+    按股票代码分组，每只股票只发起一次区间查询
+    （覆盖该股票所有买入日期），将网络请求从 O(N) 降到 O(股票数)
+
+    参数:
+        tushare_client: tushare客户端
+        items: (股票代码, 买入日期 YYYY-MM-DD, 买入价格) 元组列表
+        days_to_check: 检查后续几个交易日（默认5个）
+
+    返回:
+        与 items 等长的标签列表，无法判断的位置为 None
+    """
+    if not items:
+        return []
+
+    # 先查持久化的标签缓存，只为未命中的记录发起查询
+    cached = [_LABEL_CACHE.get((code, date, price)) for code, date, price in items]
+    pending = [item for item, label in zip(items, cached) if label is None]
+
+    if not pending or not tushare_client.is_configured():
+        return cached
+
+    ranges = _build_fetch_ranges(tushare_client, pending, days_to_check)
+
+    # 每只股票只查询一次（优先命中磁盘缓存），并一次性抽出 NumPy 数组
+    arrays = {
+        stock_code: _extract_daily_arrays(
+            _fetch_daily_cached(tushare_client, stock_code, start_date, end_date)
+        )
+        for stock_code, (start_date, end_date) in ranges.items()
+    }
+
+    fresh = iter(_classify_items(arrays, pending, days_to_check))
+    results: List[Optional[str]] = []
+    for item, label in zip(items, cached):
+        if label is None:
+            label = next(fresh)
+            if label is not None:
+                _remember_label(*item, label)
+        results.append(label)
+    return results
+
+
+def _build_fetch_ranges(
+    tushare_client: TushareClient,
+    items: List[Tuple[str, str, float]],
+    days_to_check: int
+) -> Dict[str, Tuple[str, str]]:
+    """按股票分组，计算每只股票需要覆盖的日期区间"""
+    ranges: Dict[str, Tuple[str, str]] = {}
+    for stock_code, buy_date, _ in items:
+        end_date = _classification_end_date(tushare_client, buy_date, days_to_check)
+        if stock_code in ranges:
+            cur_start, cur_end = ranges[stock_code]
+            ranges[stock_code] = (min(cur_start, buy_date), max(cur_end, end_date))
+        else:
+            ranges[stock_code] = (buy_date, end_date)
+    return ranges
+
+
+def _extract_daily_arrays(df: Optional[pd.DataFrame]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """把日线 DataFrame 抽成 (trade_date, close) NumPy 数组对"""
+    if df is None or df.empty:
+        return None
+    return (
+        df['trade_date'].values.astype('datetime64[ns]'),
+        df['close'].to_numpy(),
+    )
+
+
+def _classify_items(
+    arrays: Dict[str, Optional[Tuple[np.ndarray, np.ndarray]]],
+    items: List[Tuple[str, str, float]],
+    days_to_check: int
+) -> List[Optional[str]]:
+    """
+    对每条买入记录做一次二分查找 + 一次切片后分类，
+    不构造中间 DataFrame，切片长度为零即代表没有后续交易日
+    """
+    results: List[Optional[str]] = []
+    for stock_code, buy_date, buy_price in items:
+        stock_arrays = arrays.get(stock_code)
+        if stock_arrays is None:
+            results.append(None)
+            continue
+        try:
+            trade_dates, closes = stock_arrays
+            idx = np.searchsorted(trade_dates, np.datetime64(buy_date).astype('datetime64[ns]'), side='right')
+            close_slice = tuple(closes[idx:idx + days_to_check])
+            results.append(_classify_buy(close_slice, buy_price) if close_slice else None)
+        except (KeyError, IndexError, ValueError, TypeError, ZeroDivisionError) as e:
+            logger.debug("批量判断买入动作类型失败: %s", e)
+            results.append(None)
+    return results
+
+
+async def adetect_buy_action_types(
+    tushare_client: TushareClient,
+    items: List[Tuple[str, str, float]],
+    days_to_check: int = 5,
+    max_concurrency: int = 4
+) -> List[Optional[str]]:
+    """
+    异步批量判断买入动作类型
+
+    tushare 的 pro_api 是同步 requests 实现，这里把每只股票的区间查询
+    投递到线程池（asyncio.to_thread）并发执行，并用信号量限制并发数
+    以免触发 tushare 的限流；网络延迟在各股票之间重叠
+
+    参数和返回值与 detect_buy_action_types_batch 一致
+    """
+    if not tushare_client.is_configured() or not items:
+        return [None] * len(items)
+
+    ranges = _build_fetch_ranges(tushare_client, items, days_to_check)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(stock_code: str, start_date: str, end_date: str):
+        async with semaphore:
+            df = await asyncio.to_thread(
+                _fetch_daily_cached, tushare_client, stock_code, start_date, end_date
+            )
+            return stock_code, df
+
+    pairs = await asyncio.gather(
+        *(fetch(code, start, end) for code, (start, end) in ranges.items())
+    )
+    arrays = {code: _extract_daily_arrays(df) for code, df in pairs}
+    return _classify_items(arrays, items, days_to_check)
+
+
+def detect_buy_action_types_threaded(
+    tushare_client: TushareClient,
+    items: List[Tuple[str, str, float]],
+    days_to_check: int = 5,
+    workers: int = 16
+) -> List[Optional[str]]:
+    """
+    线程池批量判断买入动作类型
+
+    每条记录直接投给 detect_buy_action_type；requests 在套接字等待
+    期间释放 GIL，网络延迟在 workers 个线程间重叠。重复的
+    (股票, 日期, 价格) 组合会命中 _classify_buy 的记忆化缓存
+
+    参数和返回值与 detect_buy_action_types_batch 一致
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            lambda item: detect_buy_action_type(tushare_client, item[0], item[1], item[2], days_to_check),
+            items
+        ))
+
+
+def detect_buy_action_types_concurrent(
+    tushare_client: TushareClient,
+    items: List[Tuple[str, str, float]],
+    days_to_check: int = 5,
+    max_concurrency: int = 4
+) -> List[Optional[str]]:
+    """adetect_buy_action_types 的同步入口"""
+    return asyncio.run(
+        adetect_buy_action_types(tushare_client, items, days_to_check, max_concurrency)
+    )
+
 
 def detect_buy_action_type(
     tushare_client: TushareClient,
@@ -27,93 +426,111 @@ def detect_buy_action_type(
     返回:
         "涨了敢买" 或 "跌了敢买" 或 None（如果无法判断）
     """
+    # 历史标签直接复用，免去网络请求
+    cached_label = _LABEL_CACHE.get((stock_code, buy_date, buy_price))
+    if cached_label is not None:
+        return cached_label
+
     if not tushare_client.is_configured():
         return None
-    
+
     try:
-        # 计算结束日期（买入日期 + 交易日数）
-        buy_dt = datetime.strptime(buy_date, "%Y-%m-%d")
-        end_dt = buy_dt + timedelta(days=days_to_check * 2)  # 预留非交易日
-        
+        # 计算结束日期（买入日期 + 交易日数，按交易日历对齐）
+        # np.datetime64 原生解析 ISO 日期，比 strptime 快一个量级
+        buy_dt64 = np.datetime64(buy_date)
+        end_date = _classification_end_date(tushare_client, buy_date, days_to_check)
+
         # 获取买入日期之后的价格数据
-        daily_data = tushare_client.get_stock_daily(
-            stock_code,
-            buy_date,
-            end_dt.strftime("%Y-%m-%d")
-        )
-        
-        if daily_data is None or daily_data.empty:
-            return None
+        daily_data = tushare_client.get_stock_daily(stock_code, buy_date, end_date)
         
-        # 过滤掉买入日期当天的数据，只看后续交易日
-        buy_dt_only = buy_dt.date()
-        future_data = daily_data[daily_data['trade_date'].dt.date > buy_dt_only]
-        
-        if future_data.empty:
+        if daily_data is None:
             return None
-        
-        # 取前N个交易日
-        future_data = future_data.head(days_to_check)
-        
-        if future_data.empty:
-            return None
-        
-        # 计算平均收盘价（或者最后一个交易日的收盘价）
-        avg_close = future_data['close'].mean()
-        last_close = future_data['close'].iloc[-1]
-        
-        # 判断走势：如果后续价格高于买入价格，说明是"涨了敢买"
-        # 如果后续价格低于买入价格，说明是"跌了敢买"
-        if last_close > buy_price * 1.01:  # 考虑1%的误差
-            return "涨了敢买"
-        elif last_close < buy_price * 0.99:  # 考虑1%的误差
-            return "跌了敢买"
+
+        if pl is not None and isinstance(daily_data, pl.DataFrame):
+            # polars 列式路径：过滤和截断都在列式引擎内完成
+            buy_dt = buy_dt64.astype('datetime64[ms]').astype(datetime)
+            future = daily_data.filter(pl.col('trade_date') > buy_dt).head(days_to_check)
+            if future.height == 0:
+                return None
+            close_slice = tuple(future['close'].to_list())
         else:
-            # 如果价格变化不大，根据平均价格判断
-            if avg_close > buy_price:
-                return "涨了敢买"
-            else:
-                return "跌了敢买"
-    
-    except Exception as e:
-        print(f"判断买入动作类型失败: {e}")
+            if daily_data.empty:
+                return None
+
+            # pandas 路径：直接在 NumPy 数组上过滤和切片
+            # trade_date 已排序，二分查找即可定位买入日之后的首个交易日，
+            # 避免 .dt.date 逐行构造 Python date 对象再比较
+            trade_dates = daily_data['trade_date'].values.astype('datetime64[ns]')
+            closes = daily_data['close'].to_numpy()
+            idx = np.searchsorted(trade_dates, buy_dt64.astype('datetime64[ns]'), side='right')
+            close_slice = tuple(closes[idx:idx + days_to_check])
+
+            if not close_slice:
+                return None
+
+        # 判断走势：后续价格高于买入价是"涨了敢买"，低于是"跌了敢买"
+        # 1%误差范围内的用平均价格判断（记忆化的纯函数）
+        label = _classify_buy(close_slice, buy_price)
+        _remember_label(stock_code, buy_date, buy_price, label)
+        return label
+
+    except (KeyError, IndexError, ValueError, TypeError, ZeroDivisionError) as e:
+        logger.debug("判断买入动作类型失败: %s", e)
         return None
 
 
-def detect_sell_action_type(
-    buy_price: float,
-    sell_price: float,
-    buy_date: str,
-    sell_date: Optional[str] = None
-) -> Optional[str]:
+def detect_sell_action_types(buy_prices, sell_prices) -> np.ndarray:
+    """
+    向量化批量判断卖出动作类型
+
+    盈利超过1%是"涨了舍得卖"，亏损超过1%是"跌了舍得卖"，
+    1%误差范围内的直接比较价格大小——与标量版本逻辑一致，
+    但整个判断在 NumPy 数组上一次完成
+
+    参数:
+        buy_prices: 买入价格数组
+        sell_prices: 卖出价格数组
+
+    返回:
+        object 数组，元素为卖出标签，无法判断的位置为 None
+    """
+    buy = np.asarray(buy_prices, dtype=np.float64)
+    sell = np.asarray(sell_prices, dtype=np.float64)
+    valid = (buy > 0) & (sell > 0)
+
+    # 无效位置用 1 占位避免除零，结果最后会被覆盖为 None
+    profit_rate = (sell - buy) / np.where(valid, buy, 1.0)
+    up = profit_rate > 0.01
+    mid_up = (~up) & (profit_rate >= -0.01) & (sell > buy)
+
+    labels = np.where(up | mid_up, SELL_LABELS[1], SELL_LABELS[0]).astype(object)
+    labels[~valid] = None
+    return labels
+
+
+@lru_cache(maxsize=65536)
+def detect_sell_action_type(buy_price: float, sell_price: float) -> Optional[str]:
     """
     根据买入价格和卖出价格判断卖出动作类型
-    
+
+    参数全部不可变，结果用 lru_cache 记忆化
+
     参数:
         buy_price: 买入价格
         sell_price: 卖出价格
-        buy_date: 买入日期
-        sell_date: 卖出日期（可选）
-    
+
     返回:
         "涨了舍得卖" 或 "跌了舍得卖" 或 None（如果无法判断）
     """
-    if buy_price <= 0 or sell_price <= 0:
-        return None
-    
-    # 计算涨跌幅度
-    profit_rate = (sell_price - buy_price) / buy_price
-    
-    # 如果卖出价格高于买入价格，说明是"涨了舍得卖"
-    # 如果卖出价格低于买入价格，说明是"跌了舍得卖"
-    if profit_rate > 0.01:  # 盈利超过1%
-        return "涨了舍得卖"
-    elif profit_rate < -0.01:  # 亏损超过1%
-        return "跌了舍得卖"
-    else:
-        # 如果变化不大，根据价格大小判断
-        if sell_price > buy_price:
-            return "涨了舍得卖"
-        else:
-            return "跌了舍得卖"
+    return detect_sell_action_types((buy_price,), (sell_price,))[0]
+
+
+def detect_sell_action_type_legacy(
+    buy_price: float,
+    sell_price: float,
+    buy_date: str,
+    sell_date: Optional[str] = None
+) -> Optional[str]:
+    """旧的4参数签名兼容壳：日期参数从未参与判断，仅保留一个版本"""
+    return detect_sell_action_type(buy_price, sell_price)
 
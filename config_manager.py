@@ -8,13 +8,22 @@ from typing import Optional
 
 CONFIG_FILE = "app_config.json"
 
+# 进程内缓存：按文件 mtime 失效，避免每次取 token 都重新解析 JSON
+_CACHE = {"mtime": None, "data": None}
+
 
 def load_config() -> dict:
-    """加载配置文件"""
+    """加载配置文件（带 mtime 缓存，文件未变时不重新解析）"""
     if os.path.exists(CONFIG_FILE):
         try:
+            mtime = os.path.getmtime(CONFIG_FILE)
+            if _CACHE["data"] is not None and _CACHE["mtime"] == mtime:
+                return _CACHE["data"]
             with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                data = json.load(f)
+            _CACHE["mtime"] = mtime
+            _CACHE["data"] = data
+            return data
         except Exception as e:
             print(f"加载配置失败: {e}")
             return {}
@@ -22,10 +31,12 @@ def load_config() -> dict:
 
 
 def save_config(config: dict):
-    """保存配置文件"""
+    """保存配置文件并同步更新缓存"""
     try:
         with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
             json.dump(config, f, ensure_ascii=False, indent=2)
+        _CACHE["mtime"] = os.path.getmtime(CONFIG_FILE)
+        _CACHE["data"] = config
     except Exception as e:
         print(f"保存配置失败: {e}")
 
@@ -41,4 +52,3 @@ def save_tushare_token(token: str):
     config = load_config()
     config['tushare_token'] = token
     save_config(config)
-
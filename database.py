@@ -2,6 +2,7 @@
 SQLite 数据库操作模块
 """
 import sqlite3
+import threading
 from datetime import datetime
 from typing import List, Optional, Dict
 import pandas as pd
@@ -10,230 +11,453 @@ from models import Trade, Score
 
 class Database:
     """数据库管理类"""
-    
+
     def __init__(self, db_path: str = "stock_reflection.db"):
         self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()  # Streamlit 会话跑在不同线程，写入需要互斥
         self.init_database()
         self.migrate_database()  # 迁移旧数据
-    
+
     def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-    
+        """获取共享数据库连接（懒创建；WAL 模式 + 调优 pragma，读写互不阻塞）"""
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                    conn.row_factory = sqlite3.Row
+                    conn.executescript("""
+                        PRAGMA journal_mode=WAL;
+                        PRAGMA synchronous=NORMAL;
+                        PRAGMA temp_store=MEMORY;
+                        PRAGMA mmap_size=268435456;
+                        PRAGMA cache_size=-64000;
+                    """)
+                    self._conn = conn
+        return self._conn
+
     def init_database(self):
         """初始化数据库表结构"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # 创建交易记录表（新结构）
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS trades_new (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                trade_group_id INTEGER,
-                stock_code TEXT NOT NULL,
-                stock_name TEXT,
-                action_type TEXT NOT NULL,
-                trade_type TEXT NOT NULL,
-                buy_date TEXT NOT NULL,
-                sell_date TEXT,
-                buy_price REAL NOT NULL,
-                sell_price REAL,
-                quantity INTEGER NOT NULL,
-                status TEXT DEFAULT '进行中',
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # 创建评分记录表（新结构）
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS scores_new (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                trade_id INTEGER,
-                date TEXT NOT NULL,
-                action_type TEXT NOT NULL,
-                score_type TEXT NOT NULL,
-                score INTEGER NOT NULL,
-                answer TEXT,
-                reflection TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (trade_id) REFERENCES trades_new(id)
-            )
-        """)
-        
-        conn.commit()
-        conn.close()
-    
+        with self._lock:
+            cursor = conn.cursor()
+
+            # 创建交易记录表（新结构）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS trades_new (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    trade_group_id INTEGER,
+                    stock_code TEXT NOT NULL,
+                    stock_name TEXT,
+                    action_type TEXT NOT NULL,
+                    trade_type TEXT NOT NULL,
+                    buy_date TEXT NOT NULL,
+                    sell_date TEXT,
+                    buy_price REAL NOT NULL,
+                    sell_price REAL,
+                    quantity INTEGER NOT NULL,
+                    status TEXT DEFAULT '进行中',
+                    notes TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # 创建评分记录表（新结构）
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS scores_new (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    trade_id INTEGER,
+                    date TEXT NOT NULL,
+                    action_type TEXT NOT NULL,
+                    score_type TEXT NOT NULL,
+                    score INTEGER NOT NULL,
+                    answer TEXT,
+                    reflection TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (trade_id) REFERENCES trades_new(id)
+                )
+            """)
+
+            # 每日自检评分按（日期, 动作, 类型）唯一，保证整日覆盖写入不产生重复
+            try:
+                cursor.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS ux_scores_day
+                    ON scores_new(date, action_type, score_type)
+                    WHERE trade_id IS NULL
+                """)
+            except Exception as e:
+                print(f"创建唯一索引警告: {e}")
+
+            # 支持按交易组汇总卖出数量的复合索引
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_trades_group_type
+                ON trades_new(trade_group_id, trade_type)
+            """)
+
+            # 热点查询的覆盖索引：进行中交易、按股票查询、按日期/类型取评分
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_trades_status_type
+                ON trades_new(status, trade_type)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_trades_stock
+                ON trades_new(stock_code)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_scores_date_type
+                ON scores_new(date, score_type)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_scores_trade
+                ON scores_new(trade_id)
+            """)
+
+            conn.commit()
+
     def migrate_database(self):
-        """迁移旧数据库结构到新结构"""
+        """迁移旧数据库结构到新结构
+
+        整个迁移由 PRAGMA user_version 把关，只在首次启动执行一次；
+        评分迁移用 JOIN 派生表替代逐行相关子查询，复杂度从
+        O(N*M) 降到线性。
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
-        
+
+        if cursor.execute("PRAGMA user_version").fetchone()[0] >= 1:
+            return
+
         # 检查旧表是否存在
-        cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name='trades' AND name!='trades_new'
-        """)
-        old_trades_exists = cursor.fetchone() is not None
-        
-        if old_trades_exists:
-            # 迁移旧数据（如果存在）
+        old_trades_exists = cursor.execute("""
+            SELECT name FROM sqlite_master
+            WHERE type='table' AND name='trades'
+        """).fetchone() is not None
+        old_scores_exists = cursor.execute("""
+            SELECT name FROM sqlite_master
+            WHERE type='table' AND name='scores'
+        """).fetchone() is not None
+
+        with self._lock:
             try:
-                cursor.execute("""
-                    INSERT INTO trades_new 
-                    (trade_group_id, stock_code, stock_name, action_type, trade_type, 
-                     buy_date, buy_price, quantity, status, notes)
-                    SELECT 
-                        id, stock_code, stock_name, action_type, '买入',
-                        date, price, quantity, '已结束', notes
-                    FROM trades
-                """)
-                
-                cursor.execute("""
-                    INSERT INTO scores_new 
-                    (trade_id, date, action_type, score_type, score, answer, reflection)
-                    SELECT 
-                        (SELECT id FROM trades_new WHERE trade_group_id = s.date LIMIT 1),
-                        date, action_type, '主观评分', score, answer, reflection
-                    FROM scores s
-                """)
-                
+                if old_trades_exists:
+                    cursor.execute("""
+                        INSERT INTO trades_new
+                        (trade_group_id, stock_code, stock_name, action_type, trade_type,
+                         buy_date, buy_price, quantity, status, notes)
+                        SELECT
+                            id, stock_code, stock_name, action_type, '买入',
+                            date, price, quantity, '已结束', notes
+                        FROM trades
+                    """)
+
+                    # 新买入的交易组号直接用自身行 id（见 add_trade）；
+                    # 把自增序列顶到迁移组号的最大值之后，
+                    # 避免新行 id 撞上稀疏的旧组号
+                    cursor.execute("""
+                        UPDATE sqlite_sequence
+                        SET seq = (SELECT MAX(trade_group_id) FROM trades_new)
+                        WHERE name = 'trades_new'
+                          AND seq < (SELECT MAX(trade_group_id) FROM trades_new)
+                    """)
+
+                if old_scores_exists:
+                    cursor.execute("""
+                        INSERT INTO scores_new
+                        (trade_id, date, action_type, score_type, score, answer, reflection)
+                        SELECT
+                            m.trade_id, s.date, s.action_type, '主观评分',
+                            s.score, s.answer, s.reflection
+                        FROM scores s
+                        LEFT JOIN (
+                            SELECT trade_group_id, MIN(id) AS trade_id
+                            FROM trades_new
+                            GROUP BY trade_group_id
+                        ) m ON m.trade_group_id = s.date
+                    """)
+
+                cursor.execute("PRAGMA user_version = 1")
                 conn.commit()
             except Exception as e:
                 print(f"数据迁移警告: {e}")
-        
-        conn.close()
-    
+
     def add_trade(self, trade: Trade) -> int:
-        """添加交易记录"""
+        """添加交易记录
+
+        买入记录的交易组号直接取自身行 id：天然唯一，省掉随表增长的
+        MAX(trade_group_id) 扫描。INSERT 与后续 UPDATE 在同一事务内提交。
+        """
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # 如果是买入，创建新的交易组
-        if trade.trade_type == "买入":
-            # 获取下一个交易组ID
-            cursor.execute("SELECT COALESCE(MAX(trade_group_id), 0) + 1 FROM trades_new")
-            trade_group_id = cursor.fetchone()[0]
-        else:
-            trade_group_id = trade.trade_group_id
-        
-        cursor.execute("""
-            INSERT INTO trades_new 
-            (trade_group_id, stock_code, stock_name, action_type, trade_type,
-             buy_date, sell_date, buy_price, sell_price, quantity, status, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            trade_group_id,
-            trade.stock_code,
-            trade.stock_name,
-            trade.action_type,
-            trade.trade_type,
-            trade.buy_date or datetime.now().strftime("%Y-%m-%d"),
-            trade.sell_date,
-            trade.buy_price,
-            trade.sell_price,
-            trade.quantity,
-            trade.status,
-            trade.notes
-        ))
-        
-        trade_id = cursor.lastrowid
-        
-        # 如果是卖出，更新对应的买入记录状态
-        if trade.trade_type == "卖出" and trade_group_id:
+        with self._lock:
+            cursor = conn.cursor()
+
             cursor.execute("""
-                UPDATE trades_new 
-                SET status = '已结束', sell_date = ?, sell_price = ?
-                WHERE trade_group_id = ? AND trade_type = '买入'
-            """, (trade.sell_date, trade.sell_price, trade_group_id))
-        
-        conn.commit()
-        conn.close()
-        return trade_id
-    
+                INSERT INTO trades_new
+                (trade_group_id, stock_code, stock_name, action_type, trade_type,
+                 buy_date, sell_date, buy_price, sell_price, quantity, status, notes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                trade.trade_group_id,
+                trade.stock_code,
+                trade.stock_name,
+                trade.action_type,
+                trade.trade_type,
+                trade.buy_date or datetime.now().strftime("%Y-%m-%d"),
+                trade.sell_date,
+                trade.buy_price,
+                trade.sell_price,
+                trade.quantity,
+                trade.status,
+                trade.notes
+            ))
+
+            trade_id = cursor.lastrowid
+
+            if trade.trade_type == "买入":
+                # 新交易组：组号 = 买入行自身 id
+                cursor.execute("""
+                    UPDATE trades_new SET trade_group_id = ? WHERE id = ?
+                """, (trade_id, trade_id))
+            elif trade.trade_type == "卖出" and trade.trade_group_id:
+                # 如果是卖出，更新对应的买入记录状态
+                cursor.execute("""
+                    UPDATE trades_new
+                    SET status = '已结束', sell_date = ?, sell_price = ?
+                    WHERE trade_group_id = ? AND trade_type = '买入'
+                """, (trade.sell_date, trade.sell_price, trade.trade_group_id))
+
+            conn.commit()
+            return trade_id
+
     def add_score(self, score: Score) -> int:
         """添加评分记录"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO scores_new 
-            (trade_id, date, action_type, score_type, score, answer, reflection)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            score.trade_id,
-            score.date or datetime.now().strftime("%Y-%m-%d"),
-            score.action_type,
-            score.score_type,
-            score.score,
-            score.answer,
-            score.reflection
-        ))
-        
-        score_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return score_id
-    
+        with self._lock:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                INSERT INTO scores_new
+                (trade_id, date, action_type, score_type, score, answer, reflection)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                score.trade_id,
+                score.date or datetime.now().strftime("%Y-%m-%d"),
+                score.action_type,
+                score.score_type,
+                score.score,
+                score.answer,
+                score.reflection
+            ))
+
+            score_id = cursor.lastrowid
+            conn.commit()
+            return score_id
+
+    def add_scores(self, scores: List[Score]) -> int:
+        """批量添加评分记录（单事务 executemany，把 fsync 开销摊到整批）"""
+        if not scores:
+            return 0
+        conn = self.get_connection()
+
+        rows = [
+            (
+                score.trade_id,
+                score.date or datetime.now().strftime("%Y-%m-%d"),
+                score.action_type,
+                score.score_type,
+                score.score,
+                score.answer,
+                score.reflection
+            )
+            for score in scores
+        ]
+        with self._lock:
+            conn.executemany("""
+                INSERT INTO scores_new
+                (trade_id, date, action_type, score_type, score, answer, reflection)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+        return len(rows)
+
+    def upsert_daily_scores(self, date: str, scores: List[Score]) -> int:
+        """覆盖写入某日的每日自检评分：删除旧记录并批量插入，整个过程单事务"""
+        conn = self.get_connection()
+
+        rows = [
+            (
+                score.trade_id,
+                score.date or date,
+                score.action_type,
+                score.score_type,
+                score.score,
+                score.answer,
+                score.reflection
+            )
+            for score in scores
+        ]
+        with self._lock:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM scores_new
+                WHERE date = ? AND score_type = '主观评分' AND trade_id IS NULL
+            """, (date,))
+            cursor.executemany("""
+                INSERT INTO scores_new
+                (trade_id, date, action_type, score_type, score, answer, reflection)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+        return len(rows)
+
+    def _rows(self, sql: str, params=()) -> List[Dict]:
+        """执行查询并返回 list[dict]，跳过 DataFrame 构建（调用方只要字典列表）"""
+        cursor = self.get_connection().execute(sql, params)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_daily_score_ids(self, date: str) -> List[int]:
+        """获取某日每日自检评分的 ID 列表（只取 id 列，不构建 DataFrame）"""
+        conn = self.get_connection()
+        cursor = conn.execute("""
+            SELECT id FROM scores_new
+            WHERE date = ? AND score_type = '主观评分' AND trade_id IS NULL
+        """, (date,))
+        return [row[0] for row in cursor.fetchall()]
+
+    def delete_scores(self, score_ids: List[int]) -> int:
+        """按 ID 列表批量删除评分记录（单条 DELETE ... IN，单次 commit）"""
+        if not score_ids:
+            return 0
+        conn = self.get_connection()
+        with self._lock:
+            placeholders = ','.join('?' * len(score_ids))
+            cursor = conn.execute(f"DELETE FROM scores_new WHERE id IN ({placeholders})", score_ids)
+            deleted = cursor.rowcount
+            conn.commit()
+        return deleted
+
     def get_trade_by_id(self, trade_id: int) -> Optional[Dict]:
         """根据ID获取交易记录"""
-        conn = self.get_connection()
-        query = "SELECT * FROM trades_new WHERE id = ?"
-        df = pd.read_sql_query(query, conn, params=(trade_id,))
-        conn.close()
-        if not df.empty:
-            return df.iloc[0].to_dict()
-        return None
-    
+        rows = self._rows("SELECT * FROM trades_new WHERE id = ?", (trade_id,))
+        return rows[0] if rows else None
+
     def get_active_trades(self) -> List[Dict]:
         """获取所有进行中的交易"""
-        conn = self.get_connection()
-        query = """
-            SELECT * FROM trades_new 
+        return self._rows("""
+            SELECT * FROM trades_new
             WHERE status = '进行中' AND trade_type = '买入'
             ORDER BY buy_date DESC
-        """
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df.to_dict('records')
-    
+        """)
+
+    def get_active_trades_with_remaining(self) -> List[Dict]:
+        """获取进行中的交易，并在同一条 SQL 里汇总已卖出数量"""
+        return self._rows("""
+            SELECT t.*, COALESCE(SUM(s.quantity), 0) as sold_quantity
+            FROM trades_new t
+            LEFT JOIN trades_new s
+                ON s.trade_group_id = COALESCE(t.trade_group_id, t.id)
+                AND s.trade_type = '卖出'
+            WHERE t.status = '进行中' AND t.trade_type = '买入'
+            GROUP BY t.id
+            ORDER BY t.buy_date DESC
+        """)
+
     def get_sold_quantity(self, trade_group_id: int) -> int:
         """获取某个买入交易已卖出的总数量"""
         conn = self.get_connection()
-        query = """
+        cursor = conn.execute("""
             SELECT COALESCE(SUM(quantity), 0) as total_sold
             FROM trades_new
             WHERE trade_group_id = ? AND trade_type = '卖出'
-        """
-        cursor = conn.cursor()
-        cursor.execute(query, (trade_group_id,))
+        """, (trade_group_id,))
         result = cursor.fetchone()
-        conn.close()
         return result[0] if result else 0
-    
+
+    def count_trades(self) -> int:
+        """统计交易记录总数（COUNT(*)，不取整表数据）"""
+        conn = self.get_connection()
+        return conn.execute("SELECT COUNT(*) FROM trades_new").fetchone()[0]
+
+    def count_scores(self) -> int:
+        """统计评分记录总数"""
+        conn = self.get_connection()
+        return conn.execute("SELECT COUNT(*) FROM scores_new").fetchone()[0]
+
     def get_all_trades(self, limit: Optional[int] = None) -> List[Dict]:
         """获取所有交易记录（按交易组）"""
-        conn = self.get_connection()
-        
         query = """
-            SELECT * FROM trades_new 
+            SELECT * FROM trades_new
             ORDER BY buy_date DESC, created_at DESC
         """
         if limit:
             query += f" LIMIT {limit}"
-        
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df.to_dict('records')
-    
+
+        return self._rows(query)
+
+    def _trade_groups_query(self, stock: Optional[str] = None,
+                            action_type: Optional[str] = None,
+                            status: Optional[str] = None):
+        """构造筛选交易组的 SQL 和参数，供查询和统计共用"""
+        query = """
+            SELECT
+                trade_group_id,
+                stock_code,
+                stock_name,
+                action_type,
+                buy_date,
+                sell_date,
+                buy_price,
+                sell_price,
+                quantity,
+                status,
+                COUNT(*) as trade_count,
+                (sell_price - buy_price) * quantity AS profit,
+                ROUND((sell_price - buy_price) / buy_price * 100, 2) AS profit_rate
+            FROM trades_new
+            WHERE trade_type = '买入'
+        """
+        params: List = []
+        if stock:
+            query += " AND (stock_code LIKE ? OR stock_name LIKE ?)"
+            pattern = f"%{stock}%"
+            params.extend([pattern, pattern])
+        if action_type:
+            query += " AND action_type = ?"
+            params.append(action_type)
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        query += """
+            GROUP BY trade_group_id, stock_code, stock_name, action_type, buy_date, sell_date, buy_price, sell_price, quantity, status
+        """
+        return query, params
+
+    def get_trade_groups_filtered(self, stock: Optional[str] = None,
+                                  action_type: Optional[str] = None,
+                                  status: Optional[str] = None) -> List[Dict]:
+        """按条件筛选交易组，筛选/排序/盈亏计算都下推到 SQL"""
+        query, params = self._trade_groups_query(stock, action_type, status)
+        return self._rows(query + " ORDER BY buy_date DESC", params)
+
+    def get_trade_group_stats(self, stock: Optional[str] = None,
+                              action_type: Optional[str] = None,
+                              status: Optional[str] = None) -> Dict:
+        """单条 SQL 聚合交易组统计，替代对 DataFrame 的多次扫描"""
+        inner, params = self._trade_groups_query(stock, action_type, status)
+        query = f"""
+            SELECT
+                COUNT(*) as total,
+                COALESCE(SUM(status = '进行中'), 0) as active,
+                COALESCE(SUM(status = '已结束'), 0) as closed,
+                SUM(CASE WHEN status = '已结束' THEN profit END) as total_profit,
+                COUNT(DISTINCT stock_code) as stock_count
+            FROM ({inner})
+        """
+        return self._rows(query, params)[0]
+
     def get_trade_groups(self) -> List[Dict]:
         """获取所有交易组（买入+卖出）"""
-        conn = self.get_connection()
-        
         query = """
-            SELECT 
+            SELECT
                 trade_group_id,
                 stock_code,
                 stock_name,
@@ -250,70 +474,59 @@ class Database:
             GROUP BY trade_group_id, stock_code, stock_name, action_type, buy_date, sell_date, buy_price, sell_price, quantity, status
             ORDER BY buy_date DESC
         """
-        
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df.to_dict('records')
-    
+
+        return self._rows(query)
+
     def get_scores_by_trade(self, trade_id: int) -> List[Dict]:
         """获取指定交易的所有评分"""
-        conn = self.get_connection()
-        query = """
-            SELECT * FROM scores_new 
+        return self._rows("""
+            SELECT * FROM scores_new
             WHERE trade_id = ?
             ORDER BY score_type, date DESC
-        """
-        df = pd.read_sql_query(query, conn, params=(trade_id,))
-        conn.close()
-        return df.to_dict('records')
-    
+        """, (trade_id,))
+
     def get_all_scores(self, limit: Optional[int] = None, score_type: Optional[str] = None) -> List[Dict]:
         """获取所有评分记录"""
-        conn = self.get_connection()
-        
         query = "SELECT * FROM scores_new WHERE 1=1"
         params = []
-        
+
         if score_type:
             query += " AND score_type = ?"
             params.append(score_type)
-        
+
         query += " ORDER BY date DESC, created_at DESC"
-        
+
         if limit:
             query += f" LIMIT {limit}"
-        
-        df = pd.read_sql_query(query, conn, params=params if params else None)
-        conn.close()
-        return df.to_dict('records')
-    
+
+        return self._rows(query, params)
+
     def get_scores_by_date_range(self, start_date: str, end_date: str, score_type: Optional[str] = None) -> pd.DataFrame:
         """按日期范围获取评分记录"""
         conn = self.get_connection()
-        
+
         query = """
             SELECT date, action_type, score_type, score, answer, reflection
             FROM scores_new
             WHERE date >= ? AND date <= ?
         """
         params = [start_date, end_date]
-        
+
         if score_type:
             query += " AND score_type = ?"
             params.append(score_type)
-        
+
         query += " ORDER BY date ASC"
-        
+
         df = pd.read_sql_query(query, conn, params=params)
-        conn.close()
         return df
-    
+
     def get_scores_summary(self, score_type: Optional[str] = None) -> pd.DataFrame:
         """获取评分汇总统计"""
         conn = self.get_connection()
-        
+
         query = """
-            SELECT 
+            SELECT
                 action_type,
                 COUNT(*) as count,
                 AVG(score) as avg_score,
@@ -323,83 +536,71 @@ class Database:
             WHERE 1=1
         """
         params = []
-        
+
         if score_type:
             query += " AND score_type = ?"
             params.append(score_type)
-        
+
         query += " GROUP BY action_type"
-        
+
         df = pd.read_sql_query(query, conn, params=params if params else None)
-        conn.close()
         return df
-    
+
     def get_trades_by_stock(self, stock_code: str) -> List[Dict]:
         """根据股票代码获取交易记录"""
-        conn = self.get_connection()
-        query = """
-            SELECT * FROM trades_new 
-            WHERE stock_code = ? 
+        return self._rows("""
+            SELECT * FROM trades_new
+            WHERE stock_code = ?
             ORDER BY buy_date DESC
-        """
-        df = pd.read_sql_query(query, conn, params=(stock_code,))
-        conn.close()
-        return df.to_dict('records')
-    
+        """, (stock_code,))
+
     def update_trade_status(self, trade_group_id: int) -> bool:
         """检查并更新交易状态（如果全部卖出则标记为已结束）"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        
+
         # 获取买入数量和已卖出数量
         cursor.execute("""
-            SELECT quantity FROM trades_new 
+            SELECT quantity FROM trades_new
             WHERE trade_group_id = ? AND trade_type = '买入'
         """, (trade_group_id,))
         buy_result = cursor.fetchone()
-        
+
         if not buy_result:
-            conn.close()
             return False
-        
+
         buy_quantity = buy_result[0]
         sold_quantity = self.get_sold_quantity(trade_group_id)
-        
+
         # 如果全部卖出，更新状态为已结束
         if sold_quantity >= buy_quantity:
-            cursor.execute("""
-                UPDATE trades_new 
-                SET status = '已结束'
-                WHERE trade_group_id = ? AND trade_type = '买入'
-            """, (trade_group_id,))
-            success = cursor.rowcount > 0
+            with self._lock:
+                cursor.execute("""
+                    UPDATE trades_new
+                    SET status = '已结束'
+                    WHERE trade_group_id = ? AND trade_type = '买入'
+                """, (trade_group_id,))
+                success = cursor.rowcount > 0
+                conn.commit()
         else:
             success = True
-        
-        conn.commit()
-        conn.close()
+
         return success
-    
+
     def delete_trade(self, trade_id: int) -> bool:
         """删除交易记录"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM trades_new WHERE id = ?", (trade_id,))
-        success = cursor.rowcount > 0
-        
-        conn.commit()
-        conn.close()
+        with self._lock:
+            cursor = conn.execute("DELETE FROM trades_new WHERE id = ?", (trade_id,))
+            success = cursor.rowcount > 0
+            conn.commit()
         return success
-    
+
     def delete_score(self, score_id: int) -> bool:
         """删除评分记录"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM scores_new WHERE id = ?", (score_id,))
-        success = cursor.rowcount > 0
-        
-        conn.commit()
-        conn.close()
+        with self._lock:
+            cursor = conn.execute("DELETE FROM scores_new WHERE id = ?", (score_id,))
+            success = cursor.rowcount > 0
+            conn.commit()
         return success
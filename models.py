@@ -6,7 +6,7 @@ from datetime import datetime
 from typing import Optional
 
 
-@dataclass
+@dataclass(slots=True)
 class Trade:
     """交易记录数据模型 - 支持交易周期"""
     id: Optional[int] = None
@@ -24,7 +24,7 @@ class Trade:
     notes: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Score:
     """评分记录数据模型 - 支持主观和客观评分"""
     id: Optional[int] = None
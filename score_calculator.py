@@ -2,9 +2,62 @@
 客观评分计算模块
 根据交易结果计算客观评分
 """
-from typing import Optional
+from typing import Optional, Sequence
+import numpy as np
 from models import ACTION_TYPES
 
+# 评分规则表：动作类型 -> (收益率阈值%, 满分, 负收益策略)
+# "zero"      盈利 >= 阈值满分，0 到阈值线性，亏损 0 分
+# "stop_loss" 盈利或亏损 <= -阈值都是满分（及时止损），中间线性递减
+_SCORE_RULES = {
+    "涨了舍得卖": (5.0, ACTION_TYPES["涨了舍得卖"]["max_score"], "zero"),
+    "跌了敢买": (10.0, ACTION_TYPES["跌了敢买"]["max_score"], "zero"),
+    "涨了敢买": (8.0, ACTION_TYPES["涨了敢买"]["max_score"], "zero"),
+    "跌了舍得卖": (5.0, ACTION_TYPES["跌了舍得卖"]["max_score"], "stop_loss"),
+}
+
+
+def calculate_objective_score_batch(
+    action_types: Sequence[str],
+    buy_prices: Sequence[float],
+    sell_prices: Sequence[float]
+) -> np.ndarray:
+    """
+    批量计算客观评分（向量化版本）
+
+    参数为等长的动作类型/买入价/卖出价序列，
+    逐元素语义与 calculate_objective_score 一致，
+    但全程在 numpy 中计算，适合对历史交易批量重算
+
+    返回:
+        int32 数组，每个元素为 0-100 的客观评分
+    """
+    actions = np.asarray(action_types)
+    buy = np.asarray(buy_prices, dtype=np.float64)
+    sell = np.asarray(sell_prices, dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profit_rate = np.where(buy > 0, (sell - buy) / buy * 100, 0.0)
+
+    # 按规则表为每个动作类型生成分支，统一公式
+    conditions = []
+    choices = []
+    for action, (threshold, max_score, policy) in _SCORE_RULES.items():
+        conditions.append(actions == action)
+        if policy == "zero":
+            choices.append(np.floor(max_score * np.clip(profit_rate / threshold, 0, 1)))
+        else:  # stop_loss
+            choices.append(np.where(
+                (profit_rate >= 0) | (profit_rate <= -threshold),
+                float(max_score),
+                np.floor(max_score * (1 + profit_rate / threshold))
+            ))
+
+    score = np.select(conditions, choices, default=0.0)
+
+    score = np.where(buy > 0, score, 0.0)
+    return np.clip(score, 0, 100).astype(np.int32)
+
 
 def calculate_objective_score(
     action_type: str,
@@ -26,60 +79,7 @@ def calculate_objective_score(
     返回:
         客观评分 (0-100)
     """
-    if buy_price <= 0:
-        return 0
-    
-    # 计算收益率
-    profit_rate = (sell_price - buy_price) / buy_price * 100
-    
-    # 根据动作类型计算评分
-    action_info = ACTION_TYPES.get(action_type, {})
-    max_score = action_info.get("max_score", 20)
-    
-    if action_type == "涨了舍得卖":
-        # 浮盈场景：盈利越多，评分越高
-        # 盈利 >= 5%: 满分，盈利 0-5%: 线性评分，亏损: 0分
-        if profit_rate >= 5:
-            score = max_score
-        elif profit_rate >= 0:
-            score = int(max_score * (profit_rate / 5))
-        else:
-            score = 0
-    
-    elif action_type == "跌了敢买":
-        # 浮亏场景：在下跌时买入，后续盈利越多评分越高
-        # 盈利 >= 10%: 满分，盈利 0-10%: 线性评分，亏损: 0分
-        if profit_rate >= 10:
-            score = max_score
-        elif profit_rate >= 0:
-            score = int(max_score * (profit_rate / 10))
-        else:
-            score = 0
-    
-    elif action_type == "涨了敢买":
-        # 突破场景：追涨成功评分高
-        # 盈利 >= 8%: 满分，盈利 0-8%: 线性评分，亏损: 0分
-        if profit_rate >= 8:
-            score = max_score
-        elif profit_rate >= 0:
-            score = int(max_score * (profit_rate / 8))
-        else:
-            score = 0
-    
-    elif action_type == "跌了舍得卖":
-        # 破位场景：及时止损评分高
-        # 亏损 <= -5%: 满分（及时止损），亏损 -5% 到 0%: 线性递减，盈利: 满分
-        if profit_rate >= 0:
-            score = max_score  # 盈利说明判断正确
-        elif profit_rate <= -5:
-            score = max_score  # 及时止损
-        else:
-            # 亏损在 -5% 到 0% 之间，线性递减
-            score = int(max_score * (1 + profit_rate / 5))
-    
-    else:
-        score = 0
-    
-    # 确保评分在 0-100 范围内
-    return max(0, min(100, score))
+    return int(calculate_objective_score_batch(
+        [action_type], [buy_price], [sell_price]
+    )[0])
 
@@ -2,6 +2,9 @@
 Streamlit 主应用
 股票操作反思 Web App
 """
+import io
+import os
+
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
@@ -19,6 +22,18 @@ from score_calculator import calculate_objective_score
 from action_detector import detect_buy_action_type, detect_sell_action_type
 from config_manager import get_tushare_token, save_tushare_token
 
+# 可选依赖：pyexcelerate 的二维区块写入是最快的 Excel 导出路径，
+# 未安装时回退到 pandas + xlsxwriter
+try:
+    from pyexcelerate import Workbook as _XlWorkbook
+except ImportError:
+    _XlWorkbook = None
+
+# 由 ACTION_TYPES 派生的常量只需要计算一次，不必在每次 rerun 时重建
+MAX_TOTAL_SCORE = sum(v['max_score'] for v in ACTION_TYPES.values())  # 100分
+BUY_ACTION_TYPES = {k: ACTION_TYPES[k] for k in ("跌了敢买", "涨了敢买")}
+SELL_ACTION_TYPES = {k: ACTION_TYPES[k] for k in ("涨了舍得卖", "跌了舍得卖")}
+
 # 页面配置
 st.set_page_config(
     page_title="股票操作反思",
@@ -27,12 +42,159 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 初始化 session state
-if 'db' not in st.session_state:
-    st.session_state.db = Database()
+# 全局样式在脚本顶部注入一次，而不是在每张卡片的循环里重复输出；
+# Streamlit 每次 rerun 只保留重新输出的元素，所以这里不能按会话跳过
+st.markdown("""
+<style>
+div[data-testid="column"] button {
+    font-size: 28px !important;
+    padding: 2px 4px !important;
+    min-height: 40px !important;
+    border-radius: 8px !important;
+}
+</style>
+""", unsafe_allow_html=True)
+
+# 共享资源：数据库连接和 tushare 客户端在所有会话间复用，
+# 避免每个新会话都重新打开 SQLite 文件和重建客户端
+@st.cache_resource
+def get_db() -> Database:
+    return Database()
+
+
+@st.cache_resource
+def get_tushare_client() -> TushareClient:
+    return TushareClient()
+
+
+# 数据读取缓存：以版本号作为缓存键，写入后把版本号加一即可让所有读缓存失效，
+# 避免每次 rerun（例如点一次星级按钮）都重新执行全部 SELECT
+def _db_version() -> int:
+    return st.session_state.setdefault('_db_version', 0)
+
+
+def _bump_db_version():
+    st.session_state['_db_version'] = _db_version() + 1
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_all_trades(version: int):
+    return get_db().get_all_trades()
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_all_scores(version: int):
+    return get_db().get_all_scores()
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_active_trades(version: int):
+    # 单条 JOIN 查询同时带出已卖出数量，避免 N+1 查询
+    return get_db().get_active_trades_with_remaining()
+
+
+# 仪表盘是 (总分, 满分) 两个整数的纯函数，最多 101 种输出，直接按参数缓存
+@st.cache_data(show_spinner=False)
+def _cached_gauge(total_score: int, max_score: int):
+    return plot_daily_score_gauge(total_score, max_score)
+
+
+# 仪表盘单独作为 fragment 渲染：分数没变时其它区域的 rerun 不会重建这张图
+@st.fragment
+def render_gauge(total_score: int, max_score: int):
+    fig_gauge = _cached_gauge(total_score, max_score)
+    st.plotly_chart(
+        fig_gauge, 
+        config={"displayModeBar": False}, 
+        width='stretch', 
+        key="daily_gauge"
+    )
+
+
+# 复盘/历史页的分析查询按数据库文件指纹缓存：
+# 文件（含 WAL 日志）一变化缓存自动失效，无需手动清理
+def _db_fingerprint() -> float:
+    db_path = get_db().db_path
+    fingerprint = 0.0
+    for path in (db_path, db_path + '-wal'):
+        try:
+            fingerprint = max(fingerprint, os.path.getmtime(path))
+        except OSError:
+            pass
+    return fingerprint
+
+
+@st.cache_data(show_spinner=False)
+def cached_trade_groups(fingerprint: float, stock: str | None = None,
+                        action_type: str | None = None, status: str | None = None):
+    df = pd.DataFrame(get_db().get_trade_groups_filtered(stock, action_type, status))
+    # 低基数字符串列转 categorical：按码表存储，内存占用从 object 降到整数码
+    for col in ('action_type', 'status', 'stock_code', 'stock_name', 'trade_type'):
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    # 数值列降精度：股价/数量用不到 64 位，传给前端的数据量减半
+    for col in ('buy_price', 'sell_price', 'profit', 'profit_rate'):
+        if col in df.columns:
+            df[col] = df[col].astype('float32')
+    for col in ('quantity', 'trade_count'):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
+@st.cache_data(show_spinner=False)
+def cached_trade_group_stats(fingerprint: float, stock: str | None = None,
+                             action_type: str | None = None, status: str | None = None):
+    return get_db().get_trade_group_stats(stock, action_type, status)
+
+
+@st.cache_data(show_spinner=False)
+def cached_scores_summary(fingerprint: float, score_type: str | None):
+    return get_db().get_scores_summary(score_type=score_type)
+
+
+@st.cache_data(show_spinner=False)
+def cached_recent_scores(fingerprint: float, limit: int, score_type: str | None):
+    return get_db().get_all_scores(limit=limit, score_type=score_type)
+
+
+# 图表按 (数据库指纹, 筛选参数) 缓存：无关控件变化触发的 rerun 不再重建和序列化图表
+@st.cache_data(show_spinner=False)
+def cached_score_radar(fingerprint: float, score_type: str | None):
+    return plot_score_radar(get_db(), score_type=score_type)
+
+
+@st.cache_data(show_spinner=False)
+def cached_score_trend(fingerprint: float, start_date: str, end_date: str, score_type: str | None):
+    return plot_score_trend(get_db(), start_date, end_date, score_type=score_type)
+
+
+@st.cache_data(show_spinner=False)
+def cached_score_distribution(fingerprint: float, score_type: str | None):
+    return plot_score_distribution(get_db(), score_type=score_type)
+
+
+@st.cache_data(show_spinner=False)
+def cached_timeline(fingerprint: float):
+    return plot_trade_timeline(get_db().get_all_trades())
+
+
+# tushare 接口结果在一个交易日内基本不变，缓存 1 小时避免重复打 HTTP 接口
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_stock_info(stock_code: str):
+    return get_tushare_client().get_stock_basic_info(stock_code)
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_detect_buy(stock_code: str, buy_date_str: str, buy_price: float, days_to_check: int = 5):
+    return detect_buy_action_type(
+        get_tushare_client(),
+        stock_code,
+        buy_date_str,
+        buy_price,
+        days_to_check=days_to_check
+    )
 
-if 'tushare_client' not in st.session_state:
-    st.session_state.tushare_client = TushareClient()
 
 # 从配置文件加载保存的 token
 if 'tushare_token' not in st.session_state:
@@ -40,7 +202,7 @@ if 'tushare_token' not in st.session_state:
     st.session_state.tushare_token = saved_token if saved_token else ""
     # 如果存在保存的 token，自动设置
     if saved_token:
-        st.session_state.tushare_client.set_token(saved_token)
+        get_tushare_client().set_token(saved_token)
 
 # 侧边栏配置
 with st.sidebar:
@@ -49,7 +211,7 @@ with st.sidebar:
     # tushare token 配置
     st.subheader("tushare Token")
     
-    if st.session_state.tushare_client.is_configured():
+    if get_tushare_client().is_configured():
         st.success("✓ tushare 已配置")
         if st.session_state.tushare_token:
             st.caption(f"Token: {st.session_state.tushare_token[:10]}...")
@@ -70,7 +232,7 @@ with st.sidebar:
             with col1:
                 if st.button("💾 保存", key="save_token_btn"):
                     if token_input:
-                        st.session_state.tushare_client.set_token(token_input)
+                        get_tushare_client().set_token(token_input)
                         st.session_state.tushare_token = token_input
                         save_tushare_token(token_input)
                         st.session_state.show_token_input = False
@@ -91,7 +253,7 @@ with st.sidebar:
         )
         
         if token_input and token_input != st.session_state.tushare_token:
-            st.session_state.tushare_client.set_token(token_input)
+            get_tushare_client().set_token(token_input)
             st.session_state.tushare_token = token_input
             save_tushare_token(token_input)  # 保存到配置文件
             st.success("Token 已保存")
@@ -102,16 +264,34 @@ with st.sidebar:
     # 数据管理
     st.subheader("数据管理")
     if st.button("导出数据"):
-        trades = st.session_state.db.get_all_trades()
-        scores = st.session_state.db.get_all_scores()
+        trades = cached_all_trades(_db_version())
+        scores = cached_all_scores(_db_version())
         
         if trades or scores:
-            with pd.ExcelWriter("stock_reflection_data.xlsx", engine='openpyxl') as writer:
+            # 写入内存缓冲区并直接提供浏览器下载，不再经过服务器端文件
+            # xlsxwriter 批量写入明显快于 openpyxl，constant_memory 进一步压内存
+            buf = io.BytesIO()
+            if _XlWorkbook is not None:
+                # 直接按行列表整体写入，省掉 DataFrame 构建和逐格类型分派
+                wb = _XlWorkbook()
                 if trades:
-                    pd.DataFrame(trades).to_excel(writer, sheet_name='交易记录', index=False)
+                    wb.new_sheet('交易记录', data=[list(trades[0].keys())] + [list(r.values()) for r in trades])
                 if scores:
-                    pd.DataFrame(scores).to_excel(writer, sheet_name='评分记录', index=False)
-            st.success("数据已导出到 stock_reflection_data.xlsx")
+                    wb.new_sheet('评分记录', data=[list(scores[0].keys())] + [list(r.values()) for r in scores])
+                wb.save(buf)
+            else:
+                with pd.ExcelWriter(buf, engine='xlsxwriter',
+                                    engine_kwargs={'options': {'constant_memory': True}}) as writer:
+                    if trades:
+                        pd.DataFrame(trades).to_excel(writer, sheet_name='交易记录', index=False)
+                    if scores:
+                        pd.DataFrame(scores).to_excel(writer, sheet_name='评分记录', index=False)
+            st.download_button(
+                "📥 下载 stock_reflection_data.xlsx",
+                data=buf.getvalue(),
+                file_name="stock_reflection_data.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
         else:
             st.info("暂无数据可导出")
     
@@ -119,8 +299,8 @@ with st.sidebar:
     
     # 统计信息
     st.subheader("📊 统计")
-    total_trades = len(st.session_state.db.get_all_trades())
-    total_scores = len(st.session_state.db.get_all_scores())
+    total_trades = get_db().count_trades()
+    total_scores = get_db().count_scores()
     st.metric("交易记录", total_trades)
     st.metric("评分记录", total_scores)
 
@@ -138,170 +318,118 @@ with tab1:
     
     # 获取今日日期
     today = datetime.now().strftime("%Y-%m-%d")
-    buy_date = st.date_input("选择日期", value=datetime.now().date(), key="daily_date")
-    selected_date = buy_date.strftime("%Y-%m-%d")
-    
-    # 初始化评分数据
-    subjective_scores = {}
-    answers = {}
-    hardest_action = None
-    
-    # 计算今日总分（实时）
-    def calculate_total_score(scores):
-        return sum(scores.values())
-    
-    # 四张行为卡片
-    st.markdown("---")
-    st.subheader("四张行为卡片")
-    
-    # 为每个动作类型创建一张卡片
-    for idx, (action_type_key, action_info) in enumerate(ACTION_TYPES.items()):
-        with st.container():
-            # 卡片样式
-            col1, col2 = st.columns([3, 1])
-            
-            with col1:
-                # 卡片标题和说明
-                st.markdown(f"### ① {action_type_key}  {action_info['max_score']}分")
-                st.caption(f"**场景**: {action_info['description']}")
-                st.markdown(f"**🎯 克服**: {action_info['description'].split('，')[1] if '，' in action_info['description'] else action_info['description']}")
-                
-                # 自检问题
-                with st.expander("📋 自检问题", expanded=False):
-                    st.write(action_info['question'])
-                    answer = st.text_area(
-                        "你的答案",
-                        height=80,
-                        key=f"daily_answer_{action_type_key}",
-                        placeholder="记录你的思考和判断..."
-                    )
-                    answers[action_type_key] = answer
-            
-            with col2:
-                # 执行度星级评分（5个等级）
-                st.markdown("**执行度**")
-                
-                # 计算每个等级的分数
-                max_score = action_info['max_score']
-                level_score = max_score / 5  # 每个等级对应的分数
-                
-                # 初始化星级状态
-                star_key = f"star_{action_type_key}"
-                if star_key not in st.session_state:
-                    st.session_state[star_key] = 0
-                
-                # 创建5个可点击的星星按钮（横向排列，紧凑布局）
-                star_cols = st.columns([1, 1, 1, 1, 1])
-                star_level = st.session_state[star_key]
-                
-                # 使用CSS美化按钮
-                st.markdown("""
-                <style>
-                div[data-testid="column"] button {
-                    font-size: 28px !important;
-                    padding: 2px 4px !important;
-                    min-height: 40px !important;
-                    border-radius: 8px !important;
-                }
-                </style>
-                """, unsafe_allow_html=True)
-                
-                for i in range(5):
-                    with star_cols[i]:
-                        star_num = i + 1
-                        # 判断这颗星是否被选中
-                        is_selected = star_num <= star_level
-                        star_icon = "⭐" if is_selected else "☆"
-                        
-                        # 创建按钮，点击后更新星级
-                        if st.button(
-                            star_icon,
-                            key=f"star_btn_{action_type_key}_{star_num}",
-                            width='stretch',
-                            help=f"{star_num}星 ({int(star_num * level_score)}分)"
-                        ):
-                            st.session_state[star_key] = star_num
-                            star_level = star_num
-                            st.rerun()
+    # 表单批量提交：卡片内的输入只在点击保存时触发一次 rerun，
+    # 而不是每改一个控件就整页重跑
+    with st.form("daily_form"):
+        buy_date = st.date_input("选择日期", value=datetime.now().date(), key="daily_date")
+        selected_date = buy_date.strftime("%Y-%m-%d")
+        
+        # 初始化评分数据
+        subjective_scores = {}
+        answers = {}
+        hardest_action = None
+        
+        # 计算今日总分（实时）
+        def calculate_total_score(scores):
+            return sum(scores.values())
+        
+        # 四张行为卡片
+        st.markdown("---")
+        st.subheader("四张行为卡片")
+        
+        # 为每个动作类型创建一张卡片
+        for idx, (action_type_key, action_info) in enumerate(ACTION_TYPES.items()):
+            with st.container():
+                # 卡片样式
+                col1, col2 = st.columns([3, 1])
                 
-                # 根据星级计算分数
-                score = int(star_level * level_score)
-                subjective_scores[action_type_key] = score
+                with col1:
+                    # 卡片标题和说明
+                    st.markdown(f"### ① {action_type_key}  {action_info['max_score']}分")
+                    st.caption(f"**场景**: {action_info['description']}")
+                    st.markdown(f"**🎯 克服**: {action_info['description'].split('，')[1] if '，' in action_info['description'] else action_info['description']}")
+                    
+                    # 自检问题
+                    with st.expander("📋 自检问题", expanded=False):
+                        st.write(action_info['question'])
+                        answer = st.text_area(
+                            "你的答案",
+                            height=80,
+                            key=f"daily_answer_{action_type_key}",
+                            placeholder="记录你的思考和判断..."
+                        )
+                        answers[action_type_key] = answer
                 
-                # 显示当前选择的星级和分数
-                if star_level > 0:
-                    stars_display = "⭐" * star_level + "☆" * (5 - star_level)
-                    st.markdown(f"**{stars_display}**")
+                with col2:
+                    # 执行度星级评分（5个等级）
+                    st.markdown("**执行度**")
+                    
+                    # 计算每个等级的分数
+                    max_score = action_info['max_score']
+                    level_score = max_score / 5  # 每个等级对应的分数
+                    
+                    # 单个星级控件替代 5 个独立按钮：
+                    # 点击即生效，不再需要手动 st.rerun() 触发整页重跑
+                    feedback = st.feedback("stars", key=f"star_{action_type_key}")
+                    star_level = (feedback + 1) if feedback is not None else 0
+                    
+                    # 根据星级计算分数
+                    score = int(star_level * level_score)
+                    subjective_scores[action_type_key] = score
                     st.caption(f"**{score}/{max_score}分**")
-                else:
-                    st.markdown("**☆☆☆☆☆**")
-                    st.caption(f"**0/{max_score}分**")
-            
-            st.markdown("---")
-    
-    # 今日最难的一条
-    st.markdown("---")
-    st.subheader("🧠 今日最难的一条")
-    st.caption("今天哪一个动作，最违背我的本能？")
-    hardest_action = st.radio(
-        "选择最难的行动",
-        options=["无"] + list(ACTION_TYPES.keys()),
-        horizontal=True,
-        key="hardest_action"
-    )
-    
-    # 今日总分仪表盘
-    st.markdown("---")
-    total_score = calculate_total_score(subjective_scores)
-    max_total_score = sum(v['max_score'] for v in ACTION_TYPES.values())  # 100分
-    
-    # 显示仪表盘
-    fig_gauge = plot_daily_score_gauge(total_score, max_total_score)
-    st.plotly_chart(
-        fig_gauge, 
-        config={"displayModeBar": False}, 
-        width='stretch', 
-        key="daily_gauge"
-    )
-    
-    # 保存函数
-    def save_daily_scores():
-        """保存每日自检评分"""
-        saved_count = 0
-        for action_type_key, score in subjective_scores.items():
-            if score > 0:
-                score_record = Score(
+                
+                st.markdown("---")
+        
+        # 今日最难的一条
+        st.markdown("---")
+        st.subheader("🧠 今日最难的一条")
+        st.caption("今天哪一个动作，最违背我的本能？")
+        hardest_action = st.radio(
+            "选择最难的行动",
+            options=["无"] + list(ACTION_TYPES.keys()),
+            horizontal=True,
+            key="hardest_action"
+        )
+        
+        # 今日总分仪表盘
+        st.markdown("---")
+        total_score = calculate_total_score(subjective_scores)
+        
+        # 显示仪表盘
+        render_gauge(total_score, MAX_TOTAL_SCORE)
+        
+        # 保存函数
+        def save_daily_scores():
+            """保存每日自检评分"""
+            # 反思文案对整批记录相同，循环外只算一次
+            reflection_txt = f"最难行动: {hardest_action}" if hardest_action != "无" else None
+            records = [
+                Score(
                     trade_id=None,  # 每日自检不关联具体交易
                     date=selected_date,
                     action_type=action_type_key,
                     score_type="主观评分",
                     score=score,
                     answer=answers.get(action_type_key),
-                    reflection=f"最难行动: {hardest_action}" if hardest_action != "无" else None
+                    reflection=reflection_txt
                 )
-                st.session_state.db.add_score(score_record)
-                saved_count += 1
-        
-        if saved_count > 0:
-            st.success(f"✓ 今日自检已保存！总分: {total_score}/{max_total_score}分")
-            st.balloons()
-        else:
-            st.error("请至少对一个维度进行评分")
-    
-    # 保存按钮
-    if st.button("💾 保存今日自检", type="primary", width='stretch', key="daily_submit"):
-        if total_score == 0:
-            st.warning("⚠️ 请至少对一个维度进行评分")
-        else:
-            # 检查是否已有今日记录
-            today_scores = st.session_state.db.get_scores_by_date_range(selected_date, selected_date, "主观评分")
+                for action_type_key, score in subjective_scores.items()
+                if score > 0
+            ]
+            # 删除旧记录 + 批量插入在同一个事务里完成（自动覆盖当日记录）
+            saved_count = get_db().upsert_daily_scores(selected_date, records)
             
-            # 检查 DataFrame 是否为空
-            if not today_scores.empty:
-                # 删除今日旧记录（自动覆盖）
-                for _, old_score in today_scores.iterrows():
-                    st.session_state.db.delete_score(old_score['id'])
-                save_daily_scores()
+            if saved_count > 0:
+                _bump_db_version()
+                st.success(f"✓ 今日自检已保存！总分: {total_score}/{MAX_TOTAL_SCORE}分")
+                st.balloons()
+            else:
+                st.error("请至少对一个维度进行评分")
+        
+        # 保存按钮
+        if st.form_submit_button("💾 保存今日自检", type="primary", width='stretch'):
+            if total_score == 0:
+                st.warning("⚠️ 请至少对一个维度进行评分")
             else:
                 save_daily_scores()
 
@@ -309,217 +437,202 @@ with tab1:
 with tab2:
     st.header("记录买入交易")
     
-    col1, col2 = st.columns(2)
+    # 表单版本号：提交成功后加一，让所有 buy_* 控件和临时状态整体换新，
+    # 免去逐个 del session_state 键，也避免上一笔的星级残留到新交易
+    buy_v = st.session_state.setdefault('buy_form_v', 0)
     
-    with col1:
-        # 交易信息
-        st.subheader("买入信息")
-        buy_date = st.date_input("买入日期", value=datetime.now().date(), key="buy_date")
-        stock_code = st.text_input("股票代码", placeholder="例如: 000001 或 600000", help="输入6位股票代码")
-        
-        # 获取股票信息
-        stock_info = None
-        if stock_code and st.session_state.tushare_client.is_configured():
-            if st.button("查询股票信息", type="primary", key="buy_query"):
-                with st.spinner("正在查询..."):
-                    stock_info = st.session_state.tushare_client.get_stock_basic_info(stock_code)
-                    if stock_info:
-                        st.session_state.stock_info_buy = stock_info
-                        st.success(f"✓ 找到股票: {stock_info['name']}")
-                    else:
-                        st.error("未找到该股票，请检查代码是否正确")
-        
-        if 'stock_info_buy' in st.session_state:
-            stock_info = st.session_state.stock_info_buy
-            st.info(f"**{stock_info['name']}** ({stock_info['ts_code']})")
-        
-        stock_name = st.text_input("股票名称", value=stock_info['name'] if stock_info else "", key="buy_stock_name")
-        
-        buy_price = st.number_input("买入价格", min_value=0.0, format="%.2f", key="buy_price")
-        quantity = st.number_input("买入数量", min_value=0, step=100, key="buy_quantity")
-        notes = st.text_area("交易备注", height=100, key="buy_notes")
+    # 表单批量提交：查询、判断、保存均为 form_submit_button，
+    # 修改输入不再逐个触发 rerun
+    with st.form("buy_form"):
+        col1, col2 = st.columns(2)
         
-        # 动作类型自动判断
-        action_type = None
-        if stock_code and buy_price > 0 and buy_date:
-            st.markdown("**动作类型（自动判断）**")
-            if st.button("🔍 根据股票走势判断动作类型", key="detect_buy_action", type="secondary"):
-                with st.spinner("正在分析股票走势..."):
-                    action_type = detect_buy_action_type(
-                        st.session_state.tushare_client,
-                        stock_code,
-                        buy_date.strftime("%Y-%m-%d"),
-                        buy_price,
-                        days_to_check=5
-                    )
-                    if action_type:
-                        st.session_state.detected_buy_action = action_type
-                        st.success(f"✓ 自动判断: **{action_type}**")
-                    else:
-                        st.warning("⚠️ 无法自动判断，请手动选择")
+        with col1:
+            # 交易信息
+            st.subheader("买入信息")
+            buy_date = st.date_input("买入日期", value=datetime.now().date(), key=f"buy_date_{buy_v}")
+            stock_code = st.text_input("股票代码", placeholder="例如: 000001 或 600000", help="输入6位股票代码")
             
-            if 'detected_buy_action' in st.session_state:
-                action_type = st.session_state.detected_buy_action
-                st.info(f"**当前判断**: {action_type}")
-        
-        # 如果无法自动判断，允许手动选择
-        if not action_type:
-            st.markdown("**动作类型（手动选择）**")
-            action_type = st.radio(
-                "选择动作类型",
-                options=["涨了敢买", "跌了敢买"],
-                horizontal=True,
-                label_visibility="collapsed",
-                key="buy_action_type"
-            )
-    
-    with col2:
-        # 买入时的主观评分（只显示买入相关的动作类型）
-        st.subheader("买入时主观评分")
-        st.info("💡 请对买入相关的维度打分")
-        
-        # 初始化评分数据
-        buy_subjective_scores = {}
-        buy_answers = {}
-        
-        # 买入时只显示买入相关的动作类型
-        buy_action_types = {
-            "跌了敢买": ACTION_TYPES["跌了敢买"],
-            "涨了敢买": ACTION_TYPES["涨了敢买"]
-        }
-        
-        # 为每个买入相关的动作类型创建星级评分
-        for action_type_key, action_info in buy_action_types.items():
-            st.markdown(f"**{action_type_key}** ({action_info['max_score']}分)")
+            # 获取股票信息
+            stock_info = None
+            if st.form_submit_button("查询股票信息", type="primary"):
+                if not stock_code:
+                    st.error("请先填写股票代码")
+                elif not get_tushare_client().is_configured():
+                    st.error("请先配置 tushare token")
+                else:
+                    with st.spinner("正在查询..."):
+                        stock_info = cached_stock_info(stock_code)
+                        if stock_info:
+                            st.session_state[f'stock_info_buy_{buy_v}'] = stock_info
+                            st.success(f"✓ 找到股票: {stock_info['name']}")
+                        else:
+                            st.error("未找到该股票，请检查代码是否正确")
             
-            # 初始化星级状态
-            star_key = f"buy_star_{action_type_key}"
-            if star_key not in st.session_state:
-                st.session_state[star_key] = 0
+            if f'stock_info_buy_{buy_v}' in st.session_state:
+                stock_info = st.session_state[f'stock_info_buy_{buy_v}']
+                st.info(f"**{stock_info['name']}** ({stock_info['ts_code']})")
             
-            # 创建5个可点击的星星按钮
-            star_cols = st.columns([1, 1, 1, 1, 1])
-            star_level = st.session_state[star_key]
-            max_score = action_info['max_score']
-            level_score = max_score / 5
+            stock_name = st.text_input("股票名称", value=stock_info['name'] if stock_info else "", key=f"buy_stock_name_{buy_v}")
             
-            for i in range(5):
-                with star_cols[i]:
-                    star_num = i + 1
-                    is_selected = star_num <= star_level
-                    star_icon = "⭐" if is_selected else "☆"
-                    
-                    if st.button(
-                        star_icon,
-                        key=f"buy_star_btn_{action_type_key}_{star_num}",
-                        width='stretch',
-                        help=f"{star_num}星 ({int(star_num * level_score)}分)"
-                    ):
-                        st.session_state[star_key] = star_num
-                        star_level = star_num
-                        st.rerun()
+            buy_price = st.number_input("买入价格", min_value=0.0, format="%.2f", key=f"buy_price_{buy_v}")
+            quantity = st.number_input("买入数量", min_value=0, step=100, key=f"buy_quantity_{buy_v}")
+            notes = st.text_area("交易备注", height=100, key=f"buy_notes_{buy_v}")
             
-            # 计算分数
-            score = int(star_level * level_score)
-            buy_subjective_scores[action_type_key] = score
+            # 动作类型自动判断
+            action_type = None
+            st.markdown("**动作类型（自动判断）**")
+            if st.form_submit_button("🔍 根据股票走势判断动作类型"):
+                if not (stock_code and buy_price > 0 and buy_date):
+                    st.warning("请先填写股票代码和买入价格")
+                else:
+                    with st.spinner("正在分析股票走势..."):
+                        action_type = cached_detect_buy(
+                            stock_code,
+                            buy_date.strftime("%Y-%m-%d"),
+                            buy_price,
+                            days_to_check=5
+                        )
+                        if action_type:
+                            st.session_state[f'detected_buy_action_{buy_v}'] = action_type
+                            st.success(f"✓ 自动判断: **{action_type}**")
+                        else:
+                            st.warning("⚠️ 无法自动判断，请手动选择")
             
-            # 自检问题答案
-            with st.expander(f"自检问题", expanded=False):
-                st.caption(action_info['question'])
-                answer = st.text_area(
-                    "答案",
-                    height=60,
-                    key=f"buy_answer_{action_type_key}",
-                    label_visibility="collapsed"
-                )
-                buy_answers[action_type_key] = answer
+            if f'detected_buy_action_{buy_v}' in st.session_state:
+                action_type = st.session_state[f'detected_buy_action_{buy_v}']
+                st.info(f"**当前判断**: {action_type}")
             
-            st.markdown("---")
+            # 如果无法自动判断，允许手动选择
+            if not action_type:
+                st.markdown("**动作类型（手动选择）**")
+                action_type = st.radio(
+                    "选择动作类型",
+                    options=["涨了敢买", "跌了敢买"],
+                    horizontal=True,
+                    label_visibility="collapsed",
+                    key=f"buy_action_type_{buy_v}"
+                )
         
-        # 总体反思
-        buy_reflection = st.text_area("总体反思笔记", height=80, key="buy_reflection")
-    
-    # 提交按钮
-    if st.button("💾 保存买入记录和评分", type="primary", width='stretch', key="buy_submit"):
-        if not stock_code:
-            st.error("请填写股票代码")
-        elif not action_type:
-            st.error("请先判断或选择动作类型")
-        elif buy_price <= 0:
-            st.error("请输入买入价格")
-        elif quantity <= 0:
-            st.error("请输入买入数量")
-        else:
-            # 如果还未判断，尝试自动判断
-            if 'detected_buy_action' not in st.session_state or not st.session_state.detected_buy_action:
-                if st.session_state.tushare_client.is_configured():
-                    action_type = detect_buy_action_type(
-                        st.session_state.tushare_client,
-                        stock_code,
-                        buy_date.strftime("%Y-%m-%d"),
-                        buy_price
-                    )
-                    if action_type:
-                        st.session_state.detected_buy_action = action_type
-                else:
-                    # 如果tushare未配置，使用手动选择的值
-                    if action_type not in ["涨了敢买", "跌了敢买"]:
-                        st.error("请配置tushare token以自动判断，或手动选择动作类型")
-                        action_type = None
+        with col2:
+            # 买入时的主观评分（只显示买入相关的动作类型）
+            st.subheader("买入时主观评分")
+            st.info("💡 请对买入相关的维度打分")
             
-            if action_type:
-                # 保存买入交易记录
-                trade = Trade(
-                    stock_code=stock_code,
-                    stock_name=stock_name or stock_code,
-                    action_type=action_type,
-                    trade_type="买入",
-                    buy_date=buy_date.strftime("%Y-%m-%d"),
-                    buy_price=buy_price,
-                    quantity=quantity,
-                    status="进行中",
-                    notes=notes if notes else None
-                )
-                trade_id = st.session_state.db.add_trade(trade)
+            # 初始化评分数据
+            buy_subjective_scores = {}
+            buy_answers = {}
+            
+            # 为每个买入相关的动作类型创建星级评分
+            for action_type_key, action_info in BUY_ACTION_TYPES.items():
+                st.markdown(f"**{action_type_key}** ({action_info['max_score']}分)")
                 
-                # 保存四象限主观评分
-                saved_scores = []
-                for action_type_key, score in buy_subjective_scores.items():
-                    if score > 0:
-                        score_record = Score(
-                            trade_id=trade_id,
-                            date=buy_date.strftime("%Y-%m-%d"),
-                            action_type=action_type_key,
-                            score_type="主观评分",
-                            score=score,
-                            answer=buy_answers.get(action_type_key),
-                            reflection=buy_reflection if buy_reflection else None
-                        )
-                        st.session_state.db.add_score(score_record)
-                        saved_scores.append(f"{action_type_key}: {score}分")
+                max_score = action_info['max_score']
+                level_score = max_score / 5
                 
-                if saved_scores:
-                    st.success(f"✓ 买入记录和主观评分已保存！交易ID: {trade_id}")
-                    st.info(f"动作类型: {action_type} | 已保存评分: {', '.join(saved_scores)}")
-                else:
-                    st.success(f"✓ 买入记录已保存！交易ID: {trade_id}")
-                    st.info(f"动作类型: {action_type}")
-                    st.warning("⚠️ 未记录任何主观评分")
+                # 单个星级控件替代 5 个独立按钮
+                feedback = st.feedback("stars", key=f"buy_star_{action_type_key}_{buy_v}")
+                star_level = (feedback + 1) if feedback is not None else 0
                 
-                st.balloons()
+                # 计算分数
+                score = int(star_level * level_score)
+                buy_subjective_scores[action_type_key] = score
                 
-                # 清除临时状态
-                if 'stock_info_buy' in st.session_state:
-                    del st.session_state.stock_info_buy
-                if 'detected_buy_action' in st.session_state:
-                    del st.session_state.detected_buy_action
+                # 自检问题答案
+                with st.expander(f"自检问题", expanded=False):
+                    st.caption(action_info['question'])
+                    answer = st.text_area(
+                        "答案",
+                        height=60,
+                        key=f"buy_answer_{action_type_key}_{buy_v}",
+                        label_visibility="collapsed"
+                    )
+                    buy_answers[action_type_key] = answer
+                
+                st.markdown("---")
+            
+            # 总体反思
+            buy_reflection = st.text_area("总体反思笔记", height=80, key=f"buy_reflection_{buy_v}")
+        
+        # 提交按钮
+        if st.form_submit_button("💾 保存买入记录和评分", type="primary", width='stretch'):
+            if not stock_code:
+                st.error("请填写股票代码")
+            elif not action_type:
+                st.error("请先判断或选择动作类型")
+            elif buy_price <= 0:
+                st.error("请输入买入价格")
+            elif quantity <= 0:
+                st.error("请输入买入数量")
+            else:
+                # 如果还未判断，尝试自动判断
+                if not st.session_state.get(f'detected_buy_action_{buy_v}'):
+                    if get_tushare_client().is_configured():
+                        action_type = cached_detect_buy(
+                            stock_code,
+                            buy_date.strftime("%Y-%m-%d"),
+                            buy_price
+                        )
+                        if action_type:
+                            st.session_state[f'detected_buy_action_{buy_v}'] = action_type
+                    else:
+                        # 如果tushare未配置，使用手动选择的值
+                        if action_type not in ["涨了敢买", "跌了敢买"]:
+                            st.error("请配置tushare token以自动判断，或手动选择动作类型")
+                            action_type = None
+                
+                if action_type:
+                    # 保存买入交易记录
+                    trade = Trade(
+                        stock_code=stock_code,
+                        stock_name=stock_name or stock_code,
+                        action_type=action_type,
+                        trade_type="买入",
+                        buy_date=buy_date.strftime("%Y-%m-%d"),
+                        buy_price=buy_price,
+                        quantity=quantity,
+                        status="进行中",
+                        notes=notes if notes else None
+                    )
+                    trade_id = get_db().add_trade(trade)
+                    _bump_db_version()
+                    
+                    # 保存四象限主观评分（批量写入）
+                    reflection_txt = buy_reflection if buy_reflection else None
+                    records = []
+                    saved_scores = []
+                    for action_type_key, score in buy_subjective_scores.items():
+                        if score > 0:
+                            records.append(Score(
+                                trade_id=trade_id,
+                                date=buy_date.strftime("%Y-%m-%d"),
+                                action_type=action_type_key,
+                                score_type="主观评分",
+                                score=score,
+                                answer=buy_answers.get(action_type_key),
+                                reflection=reflection_txt
+                            ))
+                            saved_scores.append(f"{action_type_key}: {score}分")
+                    get_db().add_scores(records)
+                    
+                    if saved_scores:
+                        st.success(f"✓ 买入记录和主观评分已保存！交易ID: {trade_id}")
+                        st.info(f"动作类型: {action_type} | 已保存评分: {', '.join(saved_scores)}")
+                    else:
+                        st.success(f"✓ 买入记录已保存！交易ID: {trade_id}")
+                        st.info(f"动作类型: {action_type}")
+                        st.warning("⚠️ 未记录任何主观评分")
+                    
+                    st.balloons()
+                    
+                    # 轮换表单版本号：O(1) 作废所有 buy_* 控件和临时状态
+                    st.session_state.buy_form_v += 1
 
 # 标签页3: 卖出交易
 with tab3:
     st.header("记录卖出交易")
     
     # 获取进行中的交易
-    active_trades = st.session_state.db.get_active_trades()
+    active_trades = cached_active_trades(_db_version())
     
     if not active_trades:
         st.info("暂无进行中的交易")
@@ -530,253 +643,231 @@ with tab3:
             for t in active_trades
         }
         
+        # id -> 记录 的映射，选中后 O(1) 取回，不再线性扫描列表
+        active_by_id = {t['id']: t for t in active_trades}
+        
         selected_trade_key = st.selectbox("选择要卖出的交易", options=list(trade_options.keys()))
         selected_trade_id = trade_options[selected_trade_key]
-        selected_trade = next(t for t in active_trades if t['id'] == selected_trade_id)
+        selected_trade = active_by_id[selected_trade_id]
         
-        # 计算已卖出数量和剩余数量（在col定义之前，确保作用域正确）
+        # 已卖出数量由 JOIN 查询直接带出，不再单独查一次
         trade_group_id = selected_trade.get('trade_group_id', selected_trade['id'])
-        sold_quantity = st.session_state.db.get_sold_quantity(trade_group_id)
+        sold_quantity = selected_trade['sold_quantity']
         remaining_quantity = selected_trade['quantity'] - sold_quantity
         
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.subheader("卖出信息")
-            st.info(f"**股票**: {selected_trade['stock_name']} ({selected_trade['stock_code']})")
-            st.info(f"**买入日期**: {selected_trade['buy_date']}")
-            st.info(f"**买入价格**: {selected_trade['buy_price']} 元")
-            st.info(f"**买入数量**: {selected_trade['quantity']} 股")
-            
-            if sold_quantity > 0:
-                st.info(f"**已卖出**: {sold_quantity} 股")
-                st.info(f"**剩余可卖**: {remaining_quantity} 股")
-            else:
-                st.info(f"**剩余可卖**: {remaining_quantity} 股")
-            
-            sell_date = st.date_input("卖出日期", value=datetime.now().date(), key="sell_date")
-            
-            sell_quantity = st.number_input(
-                "卖出数量", 
-                min_value=1, 
-                max_value=int(remaining_quantity) if remaining_quantity > 0 else 1,
-                value=1,
-                step=100,
-                key="sell_quantity",
-                help=f"最多可卖出 {remaining_quantity} 股"
-            )
-            sell_price = st.number_input("卖出价格", min_value=0.0, format="%.2f", key="sell_price")
-            
-            # 计算盈亏（基于本次卖出数量）
-            if sell_price > 0 and selected_trade['buy_price'] > 0 and sell_quantity > 0:
-                profit = (sell_price - selected_trade['buy_price']) * sell_quantity
-                profit_rate = (sell_price - selected_trade['buy_price']) / selected_trade['buy_price'] * 100
-                st.metric("本次盈亏金额", f"{profit:,.2f} 元", f"{profit_rate:.2f}%")
-                
-                # 如果是全部卖出，显示提示
-                if sell_quantity == remaining_quantity:
-                    st.success("🎯 本次将全部卖出")
-                elif sell_quantity < remaining_quantity:
-                    st.info(f"💡 本次卖出后剩余 {remaining_quantity - sell_quantity} 股")
-        
-        with col2:
-            # 卖出时的主观评分（只显示卖出相关的动作类型）
-            st.subheader("卖出时主观评分")
-            st.info("💡 请对卖出相关的维度打分")
-            
-            # 初始化评分数据
-            sell_subjective_scores = {}
-            sell_answers = {}
-            
-            # 卖出时只显示卖出相关的动作类型
-            sell_action_types = {
-                "涨了舍得卖": ACTION_TYPES["涨了舍得卖"],
-                "跌了舍得卖": ACTION_TYPES["跌了舍得卖"]
-            }
+        # 表单批量提交：卖出信息和评分一次性提交
+        with st.form("sell_form"):
+            col1, col2 = st.columns(2)
             
-            # 为每个卖出相关的动作类型创建星级评分
-            for action_type_key, action_info in sell_action_types.items():
-                st.markdown(f"**{action_type_key}** ({action_info['max_score']}分)")
-                
-                # 初始化星级状态
-                star_key = f"sell_star_{action_type_key}"
-                if star_key not in st.session_state:
-                    st.session_state[star_key] = 0
-                
-                # 创建5个可点击的星星按钮
-                star_cols = st.columns([1, 1, 1, 1, 1])
-                star_level = st.session_state[star_key]
-                max_score = action_info['max_score']
-                level_score = max_score / 5
+            with col1:
+                st.subheader("卖出信息")
+                st.info(f"**股票**: {selected_trade['stock_name']} ({selected_trade['stock_code']})")
+                st.info(f"**买入日期**: {selected_trade['buy_date']}")
+                st.info(f"**买入价格**: {selected_trade['buy_price']} 元")
+                st.info(f"**买入数量**: {selected_trade['quantity']} 股")
                 
-                for i in range(5):
-                    with star_cols[i]:
-                        star_num = i + 1
-                        is_selected = star_num <= star_level
-                        star_icon = "⭐" if is_selected else "☆"
-                        
-                        if st.button(
-                            star_icon,
-                            key=f"sell_star_btn_{action_type_key}_{star_num}",
-                            width='stretch',
-                            help=f"{star_num}星 ({int(star_num * level_score)}分)"
-                        ):
-                            st.session_state[star_key] = star_num
-                            star_level = star_num
-                            st.rerun()
+                if sold_quantity > 0:
+                    st.info(f"**已卖出**: {sold_quantity} 股")
+                    st.info(f"**剩余可卖**: {remaining_quantity} 股")
+                else:
+                    st.info(f"**剩余可卖**: {remaining_quantity} 股")
                 
-                # 计算分数
-                score = int(star_level * level_score)
-                sell_subjective_scores[action_type_key] = score
+                sell_date = st.date_input("卖出日期", value=datetime.now().date(), key="sell_date")
                 
-                # 自检问题答案
-                with st.expander(f"自检问题", expanded=False):
-                    st.caption(action_info['question'])
-                    answer = st.text_area(
-                        "答案",
-                        height=60,
-                        key=f"sell_answer_{action_type_key}",
-                        label_visibility="collapsed"
-                    )
-                    sell_answers[action_type_key] = answer
+                sell_quantity = st.number_input(
+                    "卖出数量", 
+                    min_value=1, 
+                    max_value=int(remaining_quantity) if remaining_quantity > 0 else 1,
+                    value=1,
+                    step=100,
+                    key="sell_quantity",
+                    help=f"最多可卖出 {remaining_quantity} 股"
+                )
+                sell_price = st.number_input("卖出价格", min_value=0.0, format="%.2f", key="sell_price")
                 
-                st.markdown("---")
-            
-            # 总体反思
-            sell_reflection = st.text_area("总体反思笔记", height=80, key="sell_reflection")
+                # 计算盈亏（基于本次卖出数量）
+                if sell_price > 0 and selected_trade['buy_price'] > 0 and sell_quantity > 0:
+                    profit = (sell_price - selected_trade['buy_price']) * sell_quantity
+                    profit_rate = (sell_price - selected_trade['buy_price']) / selected_trade['buy_price'] * 100
+                    st.metric("本次盈亏金额", f"{profit:,.2f} 元", f"{profit_rate:.2f}%")
+                    
+                    # 如果是全部卖出，显示提示
+                    if sell_quantity == remaining_quantity:
+                        st.success("🎯 本次将全部卖出")
+                    elif sell_quantity < remaining_quantity:
+                        st.info(f"💡 本次卖出后剩余 {remaining_quantity - sell_quantity} 股")
             
-            # 自动判断卖出动作类型
-            sell_action_type = None
-            if sell_price > 0 and selected_trade['buy_price'] > 0:
-                st.markdown("---")
-                st.subheader("卖出动作类型（自动判断）")
-                sell_action_type = detect_sell_action_type(
-                    buy_price=selected_trade['buy_price'],
-                    sell_price=sell_price,
-                    buy_date=selected_trade['buy_date'],
-                    sell_date=sell_date.strftime("%Y-%m-%d")
-                )
-                if sell_action_type:
-                    st.session_state.detected_sell_action = sell_action_type
-                    st.info(f"**自动判断**: {sell_action_type}")
+            with col2:
+                # 卖出时的主观评分（只显示卖出相关的动作类型）
+                st.subheader("卖出时主观评分")
+                st.info("💡 请对卖出相关的维度打分")
                 
-                # 客观评分预览
-                if sell_action_type:
-                    objective_score = calculate_objective_score(
-                        action_type=sell_action_type,
-                        buy_price=selected_trade['buy_price'],
-                        sell_price=sell_price,
-                        buy_date=selected_trade['buy_date'],
-                        sell_date=sell_date.strftime("%Y-%m-%d")
-                    )
-                    st.metric("客观评分", f"{objective_score} 分", help="根据交易结果自动计算")
-        
-        # 提交按钮
-        if st.button("💾 保存卖出记录和评分", type="primary", width='stretch', key="sell_submit"):
-            if sell_price <= 0:
-                st.error("请输入卖出价格")
-            elif sell_quantity <= 0:
-                st.error("请输入卖出数量")
-            elif sell_quantity > remaining_quantity:
-                st.error(f"卖出数量不能超过剩余可卖数量 {remaining_quantity} 股")
-            else:
-                trade_group_id = selected_trade.get('trade_group_id', selected_trade['id'])
+                # 初始化评分数据
+                sell_subjective_scores = {}
+                sell_answers = {}
                 
-                # 保存卖出交易记录
-                sell_trade = Trade(
-                    trade_group_id=trade_group_id,
-                    stock_code=selected_trade['stock_code'],
-                    stock_name=selected_trade['stock_name'],
-                    action_type=None,  # 卖出记录不存储动作类型
-                    trade_type="卖出",
-                    buy_date=selected_trade['buy_date'],
-                    sell_date=sell_date.strftime("%Y-%m-%d"),
-                    buy_price=selected_trade['buy_price'],
-                    sell_price=sell_price,
-                    quantity=sell_quantity,
-                    status="已结束",  # 卖出记录总是已结束
-                    notes=None
-                )
-                sell_trade_id = st.session_state.db.add_trade(sell_trade)
+                # 为每个卖出相关的动作类型创建星级评分
+                for action_type_key, action_info in SELL_ACTION_TYPES.items():
+                    st.markdown(f"**{action_type_key}** ({action_info['max_score']}分)")
+                    
+                    max_score = action_info['max_score']
+                    level_score = max_score / 5
+                    
+                    # 单个星级控件替代 5 个独立按钮
+                    feedback = st.feedback("stars", key=f"sell_star_{action_type_key}")
+                    star_level = (feedback + 1) if feedback is not None else 0
+                    
+                    # 计算分数
+                    score = int(star_level * level_score)
+                    sell_subjective_scores[action_type_key] = score
+                    
+                    # 自检问题答案
+                    with st.expander(f"自检问题", expanded=False):
+                        st.caption(action_info['question'])
+                        answer = st.text_area(
+                            "答案",
+                            height=60,
+                            key=f"sell_answer_{action_type_key}",
+                            label_visibility="collapsed"
+                        )
+                        sell_answers[action_type_key] = answer
+                    
+                    st.markdown("---")
                 
-                # 检查并更新买入记录状态（如果全部卖出）
-                st.session_state.db.update_trade_status(trade_group_id)
+                # 总体反思
+                sell_reflection = st.text_area("总体反思笔记", height=80, key="sell_reflection")
                 
-                # 获取卖出动作类型（如果还未判断，自动判断）
-                if 'detected_sell_action' not in st.session_state or not st.session_state.detected_sell_action:
+                # 自动判断卖出动作类型
+                sell_action_type = None
+                if sell_price > 0 and selected_trade['buy_price'] > 0:
+                    st.markdown("---")
+                    st.subheader("卖出动作类型（自动判断）")
                     sell_action_type = detect_sell_action_type(
                         buy_price=selected_trade['buy_price'],
-                        sell_price=sell_price,
-                        buy_date=selected_trade['buy_date'],
-                        sell_date=sell_date.strftime("%Y-%m-%d")
+                        sell_price=sell_price
                     )
-                else:
-                    sell_action_type = st.session_state.detected_sell_action
-                
-                # 保存四象限主观评分（关联到卖出记录）
-                saved_subjective_scores = []
-                for action_type_key, score in sell_subjective_scores.items():
-                    if score > 0:
-                        score_record = Score(
-                            trade_id=sell_trade_id,  # 关联到卖出记录
-                            date=sell_date.strftime("%Y-%m-%d"),
-                            action_type=action_type_key,
-                            score_type="主观评分",
-                            score=score,
-                            answer=sell_answers.get(action_type_key),
-                            reflection=sell_reflection if sell_reflection else None
+                    if sell_action_type:
+                        st.session_state.detected_sell_action = sell_action_type
+                        st.info(f"**自动判断**: {sell_action_type}")
+                    
+                    # 客观评分预览
+                    if sell_action_type:
+                        objective_score = calculate_objective_score(
+                            action_type=sell_action_type,
+                            buy_price=selected_trade['buy_price'],
+                            sell_price=sell_price,
+                            buy_date=selected_trade['buy_date'],
+                            sell_date=sell_date.strftime("%Y-%m-%d")
                         )
-                        st.session_state.db.add_score(score_record)
-                        saved_subjective_scores.append(f"{action_type_key}: {score}分")
-                
-                # 计算并保存客观评分（使用自动判断的卖出动作类型）
-                if sell_action_type:
-                    objective_score = calculate_objective_score(
-                        action_type=sell_action_type,
+                        st.metric("客观评分", f"{objective_score} 分", help="根据交易结果自动计算")
+            
+            # 提交按钮
+            if st.form_submit_button("💾 保存卖出记录和评分", type="primary", width='stretch'):
+                if sell_price <= 0:
+                    st.error("请输入卖出价格")
+                elif sell_quantity <= 0:
+                    st.error("请输入卖出数量")
+                elif sell_quantity > remaining_quantity:
+                    st.error(f"卖出数量不能超过剩余可卖数量 {remaining_quantity} 股")
+                else:
+                    trade_group_id = selected_trade.get('trade_group_id', selected_trade['id'])
+                    
+                    # 保存卖出交易记录
+                    sell_trade = Trade(
+                        trade_group_id=trade_group_id,
+                        stock_code=selected_trade['stock_code'],
+                        stock_name=selected_trade['stock_name'],
+                        action_type=None,  # 卖出记录不存储动作类型
+                        trade_type="卖出",
+                        buy_date=selected_trade['buy_date'],
+                        sell_date=sell_date.strftime("%Y-%m-%d"),
                         buy_price=selected_trade['buy_price'],
                         sell_price=sell_price,
-                        buy_date=selected_trade['buy_date'],
-                        sell_date=sell_date.strftime("%Y-%m-%d")
+                        quantity=sell_quantity,
+                        status="已结束",  # 卖出记录总是已结束
+                        notes=None
                     )
+                    sell_trade_id = get_db().add_trade(sell_trade)
+                    _bump_db_version()
                     
-                    score_record = Score(
-                        trade_id=sell_trade_id,  # 关联到卖出记录
-                        date=sell_date.strftime("%Y-%m-%d"),
-                        action_type=sell_action_type,
-                        score_type="客观评分",
-                        score=objective_score,
-                        answer=None,
-                        reflection=None
-                    )
-                    score_id = st.session_state.db.add_score(score_record)
-                else:
-                    objective_score = 0
-                    score_id = None
-                
-                # 判断是否全部卖出
-                new_sold_quantity = sold_quantity + sell_quantity
-                is_fully_sold = new_sold_quantity >= selected_trade['quantity']
-                
-                if saved_subjective_scores:
-                    st.success(f"✓ 卖出记录、主观评分和客观评分已保存！")
-                    if is_fully_sold:
-                        st.info(f"🎯 已全部卖出 | 卖出动作类型: {sell_action_type} | 本次卖出: {sell_quantity}股 | 主观评分: {', '.join(saved_subjective_scores)} | 客观评分: {objective_score}分")
+                    # 检查并更新买入记录状态（如果全部卖出）
+                    get_db().update_trade_status(trade_group_id)
+                    
+                    # 获取卖出动作类型（如果还未判断，自动判断）
+                    if 'detected_sell_action' not in st.session_state or not st.session_state.detected_sell_action:
+                        sell_action_type = detect_sell_action_type(
+                            buy_price=selected_trade['buy_price'],
+                            sell_price=sell_price
+                        )
                     else:
-                        st.info(f"💡 本次卖出: {sell_quantity}股，剩余: {remaining_quantity - sell_quantity}股 | 卖出动作类型: {sell_action_type} | 主观评分: {', '.join(saved_subjective_scores)} | 客观评分: {objective_score}分")
-                else:
-                    st.success(f"✓ 卖出记录和客观评分已保存！")
-                    if is_fully_sold:
-                        st.info(f"🎯 已全部卖出 | 卖出动作类型: {sell_action_type} | 本次卖出: {sell_quantity}股 | 客观评分: {objective_score}分")
+                        sell_action_type = st.session_state.detected_sell_action
+                    
+                    # 保存四象限主观评分（关联到卖出记录，批量写入）
+                    reflection_txt = sell_reflection if sell_reflection else None
+                    records = []
+                    saved_subjective_scores = []
+                    for action_type_key, score in sell_subjective_scores.items():
+                        if score > 0:
+                            records.append(Score(
+                                trade_id=sell_trade_id,  # 关联到卖出记录
+                                date=sell_date.strftime("%Y-%m-%d"),
+                                action_type=action_type_key,
+                                score_type="主观评分",
+                                score=score,
+                                answer=sell_answers.get(action_type_key),
+                                reflection=reflection_txt
+                            ))
+                            saved_subjective_scores.append(f"{action_type_key}: {score}分")
+                    get_db().add_scores(records)
+                    
+                    # 计算并保存客观评分（使用自动判断的卖出动作类型）
+                    if sell_action_type:
+                        objective_score = calculate_objective_score(
+                            action_type=sell_action_type,
+                            buy_price=selected_trade['buy_price'],
+                            sell_price=sell_price,
+                            buy_date=selected_trade['buy_date'],
+                            sell_date=sell_date.strftime("%Y-%m-%d")
+                        )
+                        
+                        score_record = Score(
+                            trade_id=sell_trade_id,  # 关联到卖出记录
+                            date=sell_date.strftime("%Y-%m-%d"),
+                            action_type=sell_action_type,
+                            score_type="客观评分",
+                            score=objective_score,
+                            answer=None,
+                            reflection=None
+                        )
+                        score_id = get_db().add_score(score_record)
                     else:
-                        st.info(f"💡 本次卖出: {sell_quantity}股，剩余: {remaining_quantity - sell_quantity}股 | 卖出动作类型: {sell_action_type} | 客观评分: {objective_score}分")
-                    st.warning("⚠️ 未记录任何主观评分")
-                
-                # 清除临时状态
-                if 'detected_sell_action' in st.session_state:
-                    del st.session_state.detected_sell_action
-                
-                st.balloons()
-                st.rerun()
+                        objective_score = 0
+                        score_id = None
+                    
+                    # 判断是否全部卖出
+                    new_sold_quantity = sold_quantity + sell_quantity
+                    is_fully_sold = new_sold_quantity >= selected_trade['quantity']
+                    
+                    if saved_subjective_scores:
+                        st.success(f"✓ 卖出记录、主观评分和客观评分已保存！")
+                        if is_fully_sold:
+                            st.info(f"🎯 已全部卖出 | 卖出动作类型: {sell_action_type} | 本次卖出: {sell_quantity}股 | 主观评分: {', '.join(saved_subjective_scores)} | 客观评分: {objective_score}分")
+                        else:
+                            st.info(f"💡 本次卖出: {sell_quantity}股，剩余: {remaining_quantity - sell_quantity}股 | 卖出动作类型: {sell_action_type} | 主观评分: {', '.join(saved_subjective_scores)} | 客观评分: {objective_score}分")
+                    else:
+                        st.success(f"✓ 卖出记录和客观评分已保存！")
+                        if is_fully_sold:
+                            st.info(f"🎯 已全部卖出 | 卖出动作类型: {sell_action_type} | 本次卖出: {sell_quantity}股 | 客观评分: {objective_score}分")
+                        else:
+                            st.info(f"💡 本次卖出: {sell_quantity}股，剩余: {remaining_quantity - sell_quantity}股 | 卖出动作类型: {sell_action_type} | 客观评分: {objective_score}分")
+                        st.warning("⚠️ 未记录任何主观评分")
+                    
+                    # 清除临时状态
+                    if 'detected_sell_action' in st.session_state:
+                        del st.session_state.detected_sell_action
+                    
+                    st.balloons()
+                    st.rerun()
 
 # 标签页4: 复盘分析
 with tab4:
@@ -805,7 +896,7 @@ with tab4:
     st.subheader("🎯 行为雷达图")
     st.caption("一眼看出：你是「贪婪型 / 恐惧型 / 惜亏型」？哪个动作是长期短板？")
     
-    fig_radar = plot_score_radar(st.session_state.db, score_type=score_type)
+    fig_radar = cached_score_radar(_db_fingerprint(), score_type)
     st.plotly_chart(
         fig_radar, 
         config={"displayModeBar": False}, 
@@ -816,11 +907,11 @@ with tab4:
     # 评分趋势图
     st.markdown("---")
     st.subheader("📈 评分趋势图")
-    fig_trend = plot_score_trend(
-        st.session_state.db,
+    fig_trend = cached_score_trend(
+        _db_fingerprint(),
         start_date.strftime("%Y-%m-%d"),
         end_date.strftime("%Y-%m-%d"),
-        score_type=score_type
+        score_type
     )
     st.plotly_chart(
         fig_trend, 
@@ -834,7 +925,7 @@ with tab4:
     
     with col1:
         st.subheader("📊 评分分布")
-        fig_dist = plot_score_distribution(st.session_state.db, score_type=score_type)
+        fig_dist = cached_score_distribution(_db_fingerprint(), score_type)
         st.plotly_chart(
             fig_dist, 
             config={"displayModeBar": False}, 
@@ -845,18 +936,28 @@ with tab4:
     with col2:
         # 评分汇总表
         st.subheader("📋 评分汇总")
-        summary_df = st.session_state.db.get_scores_summary(score_type=score_type)
+        summary_df = cached_scores_summary(_db_fingerprint(), score_type)
         if not summary_df.empty:
-            summary_df = summary_df.round(2)
-            summary_df.columns = ['动作类型', '记录数', '平均分', '最低分', '最高分']
-            st.dataframe(summary_df, width='stretch')
+            # 数值格式化交给前端 column_config，省掉每次 rerun 的 round/重命名拷贝
+            st.dataframe(
+                summary_df,
+                column_config={
+                    "action_type": st.column_config.TextColumn("动作类型"),
+                    "count": st.column_config.NumberColumn("记录数"),
+                    "avg_score": st.column_config.NumberColumn("平均分", format="%.2f"),
+                    "min_score": st.column_config.NumberColumn("最低分"),
+                    "max_score": st.column_config.NumberColumn("最高分"),
+                },
+                hide_index=True,
+                width='stretch'
+            )
         else:
             st.info("暂无评分数据")
     
     # 最近评分记录
     st.markdown("---")
     st.subheader("📝 最近评分记录")
-    recent_scores = st.session_state.db.get_all_scores(limit=20, score_type=score_type)
+    recent_scores = cached_recent_scores(_db_fingerprint(), 20, score_type)
     if recent_scores:
         scores_df = pd.DataFrame(recent_scores)
         if 'score_type' in scores_df.columns:
@@ -882,69 +983,67 @@ with tab5:
     with col3:
         filter_status = st.selectbox("筛选状态", options=["全部", "进行中", "已结束"])
     
-    # 获取交易组
-    trade_groups = st.session_state.db.get_trade_groups()
-    
-    if trade_groups:
-        df = pd.DataFrame(trade_groups)
-        
-        # 应用筛选
-        if filter_stock:
-            mask = (df['stock_code'].str.contains(filter_stock, case=False, na=False) |
-                   df['stock_name'].str.contains(filter_stock, case=False, na=False))
-            df = df[mask]
-        
-        if filter_action != "全部":
-            df = df[df['action_type'] == filter_action]
-        
-        if filter_status != "全部":
-            df = df[df['status'] == filter_status]
-        
-        # 排序
-        df = df.sort_values('buy_date', ascending=False)
-        
-        # 计算盈亏
-        if 'buy_price' in df.columns and 'sell_price' in df.columns:
-            # 确保价格列为数值类型
-            df['buy_price'] = pd.to_numeric(df['buy_price'], errors='coerce')
-            df['sell_price'] = pd.to_numeric(df['sell_price'], errors='coerce')
-            df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce')
-            
-            df['profit'] = (df['sell_price'] - df['buy_price']) * df['quantity']
-            df['profit_rate'] = ((df['sell_price'] - df['buy_price']) / df['buy_price'] * 100).round(2)
-        
+    # 获取交易组（筛选、排序、盈亏计算在 SQL 中完成）
+    df = cached_trade_groups(
+        _db_fingerprint(),
+        filter_stock or None,
+        None if filter_action == "全部" else filter_action,
+        None if filter_status == "全部" else filter_status,
+    )
+
+    if not df.empty:
         # 显示数据
         display_cols = ['buy_date', 'sell_date', 'stock_code', 'stock_name', 'action_type', 
                        'buy_price', 'sell_price', 'quantity', 'status']
         if 'profit' in df.columns:
             display_cols.extend(['profit', 'profit_rate'])
         
-        display_df = df[[col for col in display_cols if col in df.columns]].copy()
-        display_df.columns = ['买入日期', '卖出日期', '股票代码', '股票名称', '动作类型', 
-                             '买入价', '卖出价', '数量', '状态'] + (['盈亏', '盈亏率%'] if 'profit' in df.columns else [])
-        
-        st.dataframe(display_df, width='stretch')
+        # 重命名/格式化交给前端 column_config；固定高度触发虚拟滚动，
+        # 长历史也只渲染可见的一屏
+        st.dataframe(
+            df[[col for col in display_cols if col in df.columns]],
+            column_config={
+                "buy_date": st.column_config.TextColumn("买入日期"),
+                "sell_date": st.column_config.TextColumn("卖出日期"),
+                "stock_code": st.column_config.TextColumn("股票代码"),
+                "stock_name": st.column_config.TextColumn("股票名称"),
+                "action_type": st.column_config.TextColumn("动作类型"),
+                "buy_price": st.column_config.NumberColumn("买入价", format="%.2f"),
+                "sell_price": st.column_config.NumberColumn("卖出价", format="%.2f"),
+                "quantity": st.column_config.NumberColumn("数量"),
+                "status": st.column_config.TextColumn("状态"),
+                "profit": st.column_config.NumberColumn("盈亏", format="%.2f"),
+                "profit_rate": st.column_config.NumberColumn("盈亏率%", format="%.2f"),
+            },
+            hide_index=True,
+            height=500,
+            width='stretch'
+        )
         
-        # 统计信息
+        # 统计信息（单条 SQL 聚合，不再多次扫描 DataFrame）
+        stats = cached_trade_group_stats(
+            _db_fingerprint(),
+            filter_stock or None,
+            None if filter_action == "全部" else filter_action,
+            None if filter_status == "全部" else filter_status,
+        )
         st.markdown("---")
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("总交易数", len(df))
+            st.metric("总交易数", stats['total'])
         with col2:
-            st.metric("进行中", len(df[df['status'] == '进行中']))
+            st.metric("进行中", stats['active'])
         with col3:
-            st.metric("已结束", len(df[df['status'] == '已结束']))
+            st.metric("已结束", stats['closed'])
         with col4:
-            if 'profit' in df.columns and not df[df['status'] == '已结束']['profit'].isna().all():
-                total_profit = df[df['status'] == '已结束']['profit'].sum()
-                st.metric("总盈亏", f"{total_profit:,.2f} 元")
+            if stats['total_profit'] is not None:
+                st.metric("总盈亏", f"{stats['total_profit']:,.2f} 元")
             else:
-                st.metric("涉及股票数", df['stock_code'].nunique())
+                st.metric("涉及股票数", stats['stock_count'])
         
         # 交易时间线
         st.subheader("📅 交易时间线")
-        all_trades = st.session_state.db.get_all_trades()
-        fig_timeline = plot_trade_timeline(all_trades)
+        fig_timeline = cached_timeline(_db_fingerprint())
         st.plotly_chart(
             fig_timeline, 
             config={"displayModeBar": False}, 
@@ -1,6 +1,9 @@
 """
 tushare API 封装模块
 """
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import tushare as ts
 from typing import Optional, Dict
 import pandas as pd
@@ -8,10 +11,22 @@ import pandas as pd
 
 class TushareClient:
     """tushare API 客户端封装"""
-    
+
+    # 股票目录缓存有效期：目录每个交易日至多变化一次
+    BASIC_CACHE_TTL = 86400
+    # 日线缓存最多保留的 (代码, 日期区间) 组合数
+    DAILY_CACHE_SIZE = 512
+
     def __init__(self, token: Optional[str] = None):
         self.token = token
         self.pro = None
+        # stock_basic 目录缓存及 O(1) 查找索引
+        self._basic_df = None
+        self._basic_by_ts = {}
+        self._basic_by_symbol = {}
+        self._basic_ts = 0.0
+        # 日线数据 LRU 缓存：已收盘区间的 K 线不会再变
+        self._daily_cache = OrderedDict()
         if token:
             self.set_token(token)
     
@@ -24,7 +39,30 @@ class TushareClient:
     def is_configured(self) -> bool:
         """检查是否已配置 token"""
         return self.pro is not None
-    
+
+    @staticmethod
+    def _normalize_ts_code(stock_code: str) -> str:
+        """把 '000001' / '000001.SZ' 等写法统一成 tushare 的 ts_code 格式"""
+        code = stock_code.replace('.', '')
+        if len(code) == 6:
+            # 6 开头为上交所，其余为深交所
+            return f"{code}.SH" if code.startswith('6') else f"{code}.SZ"
+        return stock_code
+
+    def _ensure_basic(self):
+        """拉取并缓存全量股票目录，同时建好 ts_code/symbol 两个索引"""
+        if self._basic_df is not None and time.time() - self._basic_ts < self.BASIC_CACHE_TTL:
+            return
+        df = self.pro.stock_basic(
+            exchange='',
+            list_status='L',
+            fields='ts_code,symbol,name,area,industry,list_date'
+        )
+        self._basic_df = df
+        self._basic_by_ts = df.set_index('ts_code', drop=False).to_dict('index')
+        self._basic_by_symbol = df.set_index('symbol', drop=False).to_dict('index')
+        self._basic_ts = time.time()
+
     def get_stock_basic_info(self, stock_code: str) -> Optional[Dict]:
         """
         获取股票基本信息
@@ -37,30 +75,25 @@ class TushareClient:
         try:
             # 处理股票代码格式
             code = stock_code.replace('.', '')
-            if len(code) == 6:
-                # 判断是上交所还是深交所
-                if code.startswith('6'):
-                    ts_code = f"{code}.SH"
-                else:
-                    ts_code = f"{code}.SZ"
-            else:
-                ts_code = stock_code
-            
-            # 获取股票基本信息
-            df = self.pro.stock_basic(
-                exchange='',
-                list_status='L',
-                fields='ts_code,symbol,name,area,industry,list_date'
-            )
-            
-            # 查找匹配的股票
-            stock_info = df[df['ts_code'] == ts_code]
-            if stock_info.empty:
-                # 尝试用 symbol 查找
-                stock_info = df[df['symbol'] == code]
-            
-            if not stock_info.empty:
-                row = stock_info.iloc[0]
+            ts_code = self._normalize_ts_code(stock_code)
+
+            # 目录每天至多拉取一次，之后直接查字典索引
+            self._ensure_basic()
+            row = self._basic_by_ts.get(ts_code) or self._basic_by_symbol.get(code)
+
+            if row is None:
+                # 缓存目录里没有（比如当天新上市）：用服务端 ts_code 过滤
+                # 只取这一行，而不是重新下载全量目录
+                df = self.pro.stock_basic(
+                    ts_code=ts_code,
+                    fields='ts_code,symbol,name,area,industry,list_date'
+                )
+                if df is not None and not df.empty:
+                    row = df.iloc[0].to_dict()
+                    self._basic_by_ts[row['ts_code']] = row
+                    self._basic_by_symbol[row['symbol']] = row
+
+            if row is not None:
                 return {
                     'ts_code': row['ts_code'],
                     'symbol': row['symbol'],
@@ -74,13 +107,15 @@ class TushareClient:
             print(f"获取股票信息失败: {e}")
             return None
     
-    def get_stock_daily(self, stock_code: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+    def get_stock_daily(self, stock_code: str, start_date: str, end_date: str, backend: str = 'pandas'):
         """
         获取股票日线数据
         参数:
             stock_code - 股票代码
             start_date - 开始日期，格式 'YYYYMMDD'
             end_date - 结束日期，格式 'YYYYMMDD'
+            backend - 'pandas'（默认）或 'polars'；polars 是可选依赖，
+                      列式引擎在过滤/切片类操作上更快
         返回: DataFrame 包含日期、开盘、收盘、最高、最低等数据
         """
         if not self.is_configured():
@@ -88,32 +123,88 @@ class TushareClient:
         
         try:
             # 处理股票代码格式
-            code = stock_code.replace('.', '')
-            if len(code) == 6:
-                if code.startswith('6'):
-                    ts_code = f"{code}.SH"
-                else:
-                    ts_code = f"{code}.SZ"
+            ts_code = self._normalize_ts_code(stock_code)
+            key = (ts_code, start_date.replace('-', ''), end_date.replace('-', ''))
+
+            # 命中缓存：同一 (代码, 区间) 的 K 线不会变，免掉 HTTP 往返
+            if key in self._daily_cache:
+                self._daily_cache.move_to_end(key)
+                df = self._daily_cache[key]
             else:
-                ts_code = stock_code
-            
-            # 获取日线数据
-            df = self.pro.daily(
-                ts_code=ts_code,
-                start_date=start_date.replace('-', ''),
-                end_date=end_date.replace('-', '')
-            )
-            
+                # 获取日线数据
+                df = self.pro.daily(
+                    ts_code=key[0],
+                    start_date=key[1],
+                    end_date=key[2]
+                )
+
+                if df is not None and not df.empty:
+                    # 转换日期格式（cache=True 复用重复日期串的解析结果）
+                    df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d', cache=True)
+                    # tushare 按日期倒序返回：反转视图即可升序，省掉一次排序
+                    df = df.iloc[::-1].reset_index(drop=True)
+                    if not df['trade_date'].is_monotonic_increasing:
+                        df = df.sort_values('trade_date')
+                    self._daily_cache[key] = df
+                    if len(self._daily_cache) > self.DAILY_CACHE_SIZE:
+                        self._daily_cache.popitem(last=False)
+
             if df is not None and not df.empty:
-                # 转换日期格式
-                df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d')
-                df = df.sort_values('trade_date')
-            
+                if backend == 'polars':
+                    import polars as pl  # 可选依赖，仅在显式要求时导入
+                    return pl.from_pandas(df)
+                # 返回副本，避免调用方改动污染缓存
+                return df.copy()
+
             return df
         except Exception as e:
             print(f"获取股票日线数据失败: {e}")
             return None
     
+    def get_many_stock_daily(self, stock_codes, start_date: str, end_date: str,
+                             workers: int = 8) -> Dict:
+        """
+        并发获取多只股票的日线数据
+        tushare 接口一次只能查一只股票，串行取 N 只要等 N 个往返；
+        这里用线程池把 HTTP 等待重叠起来
+        参数:
+            stock_codes - 股票代码列表
+            start_date/end_date - 日期范围，格式同 get_stock_daily
+            workers - 并发线程数
+        返回: {股票代码: DataFrame 或 None}
+        """
+        if not self.is_configured():
+            return {code: None for code in stock_codes}
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                code: executor.submit(self.get_stock_daily, code, start_date, end_date)
+                for code in stock_codes
+            }
+            return {code: future.result() for code, future in futures.items()}
+
+    def get_trade_cal(self, start_date: str = '20100101', end_date: str = '20301231') -> Optional[pd.DataFrame]:
+        """
+        获取交易日历（只含开市日）
+        参数:
+            start_date - 开始日期，格式 'YYYYMMDD'
+            end_date - 结束日期，格式 'YYYYMMDD'
+        返回: DataFrame 包含 cal_date 等字段
+        """
+        if not self.is_configured():
+            return None
+
+        try:
+            return self.pro.trade_cal(
+                exchange='SSE',
+                start_date=start_date.replace('-', ''),
+                end_date=end_date.replace('-', ''),
+                is_open='1'
+            )
+        except Exception as e:
+            print(f"获取交易日历失败: {e}")
+            return None
+
     def get_realtime_quote(self, stock_code: str) -> Optional[Dict]:
         """
         获取股票实时行情（需要权限）
@@ -125,20 +216,14 @@ class TushareClient:
         
         try:
             # 处理股票代码格式
-            code = stock_code.replace('.', '')
-            if len(code) == 6:
-                if code.startswith('6'):
-                    ts_code = f"{code}.SH"
-                else:
-                    ts_code = f"{code}.SZ"
-            else:
-                ts_code = stock_code
-            
+            ts_code = self._normalize_ts_code(stock_code)
+
             # 获取实时行情（需要相应权限）
             df = self.pro.daily(ts_code=ts_code, limit=1)
             
             if df is not None and not df.empty:
-                latest = df.iloc[0]
+                # 一次性转成 dict，避免对 Series 逐列装箱取值
+                latest = df.iloc[0].to_dict()
                 return {
                     'ts_code': ts_code,
                     'close': latest['close'],
@@ -1,6 +1,9 @@
 """
 数据可视化模块
 """
+from bisect import bisect_right
+from collections import defaultdict
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
@@ -8,102 +11,157 @@ from typing import List, Dict, Optional
 from database import Database
 from models import ACTION_TYPES
 
+# 超过该点数的序列在绘图前先降采样，避免把全部原始点推给浏览器
+MAX_PLOT_POINTS = 2000
+
+# 仪表盘分数区间及对应的颜色/文案（区间按 bisect_right 查找）
+_GAUGE_THRESHOLDS = (50, 70, 85)
+_GAUGE_STYLES = (
+    ("#FF6B6B", "今日不适合重仓"),   # < 50 红色
+    ("#FFE66D", "情绪干扰明显"),     # 50-69 黄色
+    ("#4ECDC4", "合格执行"),         # 70-84 青色
+    ("#00C853", "纪律碾压市场"),     # >= 85 绿色
+)
+
+# 各动作类型的固定配色，模块加载时建一次
+_ACTION_COLORS = {
+    "涨了舍得卖": "#FF6B6B",
+    "跌了敢买": "#4ECDC4",
+    "涨了敢买": "#FFE66D",
+    "跌了舍得卖": "#95E1D3"
+}
+
+
+def _empty_figure(text: str) -> go.Figure:
+    """无数据时的占位空图"""
+    fig = go.Figure()
+    fig.add_annotation(
+        text=text,
+        xref="paper", yref="paper",
+        x=0.5, y=0.5,
+        showarrow=False
+    )
+    return fig
+
+
+def _lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int = MAX_PLOT_POINTS) -> np.ndarray:
+    """
+    LTTB（最大三角形三桶）降采样，返回保留点的下标
+    保留首尾点，其余点按桶选取与相邻点构成三角形面积最大的一个，
+    在大幅减少点数的同时保持曲线的视觉形状
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 中间点分成 n_out-2 个桶
+    bucket_bounds = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = bucket_bounds[i], max(bucket_bounds[i + 1], bucket_bounds[i] + 1)
+        # 下一个桶的平均点（最后一个桶用末尾点）
+        nlo, nhi = (bucket_bounds[i + 1], bucket_bounds[i + 2]) if i < n_out - 3 else (n - 1, n)
+        nhi = max(nhi, nlo + 1)
+        avg_x = x[nlo:nhi].mean()
+        avg_y = y[nlo:nhi].mean()
+        # 三角形面积（去掉常数因子 1/2）
+        area = np.abs(
+            (x[prev] - avg_x) * (y[lo:hi] - y[prev]) -
+            (x[prev] - x[lo:hi]) * (avg_y - y[prev])
+        )
+        prev = lo + int(area.argmax())
+        indices[i + 1] = prev
+
+    return indices
+
+
+def _downsample(df: pd.DataFrame, x_col: str, y_col: Optional[str] = None) -> pd.DataFrame:
+    """按 LTTB 对超长序列降采样；y_col 为 None 时按 x 均匀分桶取点"""
+    if len(df) <= MAX_PLOT_POINTS:
+        return df
+    x = df[x_col].astype('int64').to_numpy()
+    y = df[y_col].to_numpy() if y_col else np.zeros(len(df))
+    return df.iloc[_lttb_indices(x, y)]
+
 
 def plot_score_trend(db: Database, start_date: Optional[str] = None, end_date: Optional[str] = None, score_type: Optional[str] = None) -> go.Figure:
     """
     绘制评分趋势折线图
     显示4个维度的评分随时间的变化
     """
+    # 统一整理成 {(动作类型, 评分类型或None): (日期数组, 评分数组)}
+    series = {}
+
     if start_date and end_date:
         df = db.get_scores_by_date_range(start_date, end_date, score_type)
+        if not df.empty:
+            # 转换日期格式
+            df['date'] = pd.to_datetime(df['date'])
+            df = df.sort_values('date')
+            # 一次 groupby 划分所有子序列，替代每个动作/评分类型各扫一遍全表
+            if 'score_type' in df.columns:
+                grouped = df.groupby(['action_type', 'score_type'], sort=False)
+            else:
+                grouped = (((a, None), sub) for a, sub in df.groupby('action_type', sort=False))
+            for key, sub_df in grouped:
+                # 评分在 0-100 内，int16 足够，线上传输字节减半
+                series[key] = (sub_df['date'].to_numpy(), sub_df['score'].to_numpy(dtype=np.int16))
     else:
+        # 列表够用时直接用纯 Python 分组，跳过 DataFrame 构造
         scores = db.get_all_scores(score_type=score_type)
-        df = pd.DataFrame(scores)
-    
-    if df.empty:
-        # 返回空图表
-        fig = go.Figure()
-        fig.add_annotation(
-            text="暂无评分数据",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5,
-            showarrow=False
-        )
-        return fig
-    
-    # 转换日期格式
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date')
-    
-    # 创建折线图
-    fig = go.Figure()
-    
-    # 为每个动作类型绘制一条线
-    colors = {
-        "涨了舍得卖": "#FF6B6B",
-        "跌了敢买": "#4ECDC4",
-        "涨了敢买": "#FFE66D",
-        "跌了舍得卖": "#95E1D3"
+        scores.sort(key=lambda r: r['date'])
+        by_key = defaultdict(lambda: ([], []))
+        for r in scores:
+            xs, ys = by_key[(r['action_type'], r.get('score_type'))]
+            xs.append(r['date'])
+            ys.append(r['score'])
+        for key, (xs, ys) in by_key.items():
+            series[key] = (np.asarray(xs, dtype='datetime64[s]'), np.asarray(ys, dtype=np.int16))
+
+    if not series:
+        return _empty_figure("暂无评分数据")
+
+    # 所有 trace 先收集到列表，最后一次性构造 Figure，
+    # 避免逐个 add_trace 的重复校验开销
+    traces = []
+
+    # 主观评分实线圆点，客观评分虚线菱形；兼容无评分类型的旧数据
+    styles = {
+        '主观评分': (' (主观)', 'solid', dict(size=8)),
+        '客观评分': (' (客观)', 'dash', dict(size=8, symbol='diamond')),
+        None: ('', 'solid', dict(size=8)),
     }
-    
-    # 如果有评分类型，区分显示
-    if 'score_type' in df.columns:
-        for action_type in ACTION_TYPES.keys():
-            action_df = df[df['action_type'] == action_type]
-            if not action_df.empty:
-                # 主观评分用实线
-                subjective_df = action_df[action_df['score_type'] == '主观评分']
-                if not subjective_df.empty:
-                    fig.add_trace(go.Scatter(
-                        x=subjective_df['date'],
-                        y=subjective_df['score'],
-                        mode='lines+markers',
-                        name=f"{action_type} (主观)",
-                        line=dict(color=colors.get(action_type, "#000000"), width=2, dash='solid'),
-                        marker=dict(size=8),
-                        hovertemplate=f'<b>{action_type} (主观)</b><br>' +
-                                    '日期: %{x}<br>' +
-                                    '评分: %{y}<br>' +
-                                    '<extra></extra>'
-                    ))
-                
-                # 客观评分用虚线
-                objective_df = action_df[action_df['score_type'] == '客观评分']
-                if not objective_df.empty:
-                    fig.add_trace(go.Scatter(
-                        x=objective_df['date'],
-                        y=objective_df['score'],
-                        mode='lines+markers',
-                        name=f"{action_type} (客观)",
-                        line=dict(color=colors.get(action_type, "#000000"), width=2, dash='dash'),
-                        marker=dict(size=8, symbol='diamond'),
-                        hovertemplate=f'<b>{action_type} (客观)</b><br>' +
-                                    '日期: %{x}<br>' +
-                                    '评分: %{y}<br>' +
-                                    '<extra></extra>'
-                    ))
-    else:
-        # 兼容旧数据
-        for action_type in ACTION_TYPES.keys():
-            action_df = df[df['action_type'] == action_type]
-            if not action_df.empty:
-                fig.add_trace(go.Scatter(
-                    x=action_df['date'],
-                    y=action_df['score'],
-                    mode='lines+markers',
-                    name=action_type,
-                    line=dict(color=colors.get(action_type, "#000000"), width=2),
-                    marker=dict(size=8),
-                    hovertemplate=f'<b>{action_type}</b><br>' +
-                                '日期: %{x}<br>' +
-                                '评分: %{y}<br>' +
-                                '<extra></extra>'
-                ))
+    for (action_type, stype), (x, y) in series.items():
+        if action_type not in ACTION_TYPES or stype not in styles:
+            continue
+        suffix, dash, marker = styles[stype]
+        if len(x) > MAX_PLOT_POINTS:
+            idx = _lttb_indices(x.astype('int64'), y)
+            x, y = x[idx], y[idx]
+        traces.append(go.Scattergl(
+            x=x,
+            y=y,
+            mode='lines+markers',
+            name=f"{action_type}{suffix}",
+            line=dict(color=_ACTION_COLORS.get(action_type, "#000000"), width=2, dash=dash),
+            marker=marker,
+            hovertemplate=f'<b>{action_type}{suffix}</b><br>' +
+                        '日期: %{x}<br>' +
+                        '评分: %{y}<br>' +
+                        '<extra></extra>'
+        ))
     
     title = "评分趋势图"
     if score_type:
         title += f" ({score_type})"
-    
+
+    fig = go.Figure(data=traces)
     fig.update_layout(
         title=title,
         xaxis_title="日期",
@@ -116,9 +174,11 @@ def plot_score_trend(db: Database, start_date: Optional[str] = None, end_date: O
             xanchor="right",
             x=1
         ),
-        height=500
+        height=500,
+        # 固定 uirevision：rerun 重绘时保留用户的缩放/平移状态
+        uirevision='keep'
     )
-    
+
     return fig
 
 
@@ -128,52 +188,34 @@ def plot_score_distribution(db: Database, score_type: Optional[str] = None) -> g
     显示各动作类型的平均分、最高分、最低分
     """
     df = db.get_scores_summary(score_type=score_type)
-    
+
     if df.empty:
-        fig = go.Figure()
-        fig.add_annotation(
-            text="暂无评分数据",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5,
-            showarrow=False
-        )
-        return fig
-    
-    # 创建分组柱状图
-    fig = go.Figure()
-    
-    fig.add_trace(go.Bar(
-        name='平均分',
-        x=df['action_type'],
-        y=df['avg_score'],
-        marker_color='#4ECDC4',
-        text=df['avg_score'].round(1),
-        textposition='outside'
-    ))
-    
-    fig.add_trace(go.Bar(
-        name='最高分',
-        x=df['action_type'],
-        y=df['max_score'],
-        marker_color='#95E1D3',
-        text=df['max_score'],
-        textposition='outside'
-    ))
-    
-    fig.add_trace(go.Bar(
-        name='最低分',
-        x=df['action_type'],
-        y=df['min_score'],
-        marker_color='#FF6B6B',
-        text=df['min_score'],
-        textposition='outside'
-    ))
-    
+        return _empty_figure("暂无评分数据")
+
+    # 转长表后由 px.bar 一次构图，替代三次 add_trace 的逐个校验
+    long_df = df.melt(
+        id_vars='action_type',
+        value_vars=['avg_score', 'max_score', 'min_score'],
+        var_name='stat', value_name='score'
+    )
+    long_df['score'] = long_df['score'].astype(np.float32)
+    long_df['stat'] = long_df['stat'].map(
+        {'avg_score': '平均分', 'max_score': '最高分', 'min_score': '最低分'}
+    )
+
+    fig = px.bar(
+        long_df,
+        x='action_type', y='score', color='stat',
+        barmode='group',
+        text=long_df['score'].round(1),
+        color_discrete_map={'平均分': '#4ECDC4', '最高分': '#95E1D3', '最低分': '#FF6B6B'}
+    )
+    fig.update_traces(textposition='outside')
     fig.update_layout(
         title="评分分布统计",
         xaxis_title="动作类型",
         yaxis_title="评分",
-        barmode='group',
+        legend_title_text='',
         height=400
     )
     
@@ -186,17 +228,11 @@ def plot_score_radar(db: Database, score_type: Optional[str] = None) -> go.Figur
     显示各维度的平均分
     """
     df = db.get_scores_summary(score_type=score_type)
-    
-    if df.empty:
-        fig = go.Figure()
-        fig.add_annotation(
-            text="暂无评分数据",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5,
-            showarrow=False
-        )
-        return fig
-    
+
+    # 全空/全 NaN 的汇总没必要铺整张极坐标图
+    if df.empty or df['avg_score'].isna().all():
+        return _empty_figure("暂无评分数据")
+
     # 准备雷达图数据
     categories = df['action_type'].tolist()
     values = df['avg_score'].tolist()
@@ -227,7 +263,8 @@ def plot_score_radar(db: Database, score_type: Optional[str] = None) -> go.Figur
             )),
         showlegend=True,
         title="行为雷达图（复盘用）",
-        height=500
+        height=500,
+        uirevision='keep'
     )
     
     return fig
@@ -240,18 +277,7 @@ def plot_daily_score_gauge(total_score: int, max_score: int = 100) -> go.Figure:
     score_ratio = total_score / max_score if max_score > 0 else 0
     
     # 根据分数区间确定颜色和文案
-    if total_score >= 85:
-        color = "#00C853"  # 绿色
-        feedback = "纪律碾压市场"
-    elif total_score >= 70:
-        color = "#4ECDC4"  # 青色
-        feedback = "合格执行"
-    elif total_score >= 50:
-        color = "#FFE66D"  # 黄色
-        feedback = "情绪干扰明显"
-    else:
-        color = "#FF6B6B"  # 红色
-        feedback = "今日不适合重仓"
+    color, feedback = _GAUGE_STYLES[bisect_right(_GAUGE_THRESHOLDS, total_score)]
     
     fig = go.Figure(go.Indicator(
         mode="gauge+number+delta",
@@ -289,45 +315,30 @@ def plot_trade_timeline(trades: List[Dict]) -> go.Figure:
     绘制交易记录时间线
     """
     if not trades:
-        fig = go.Figure()
-        fig.add_annotation(
-            text="暂无交易记录",
-            xref="paper", yref="paper",
-            x=0.5, y=0.5,
-            showarrow=False
-        )
-        return fig
+        return _empty_figure("暂无交易记录")
     
     df = pd.DataFrame(trades)
-    if 'buy_date' in df.columns:
-        df['date'] = pd.to_datetime(df['buy_date'])
-    elif 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'])
+    # 按优先级挑日期列；全都没有时统一用当前时间兜底
+    date_col = next((c for c in ('buy_date', 'date', 'created_at') if c in df.columns), None)
+    if date_col is None:
+        df['date'] = pd.Timestamp.now()
     else:
-        df['date'] = pd.to_datetime(df.get('created_at', pd.Timestamp.now()))
+        df['date'] = pd.to_datetime(df[date_col], cache=True)
     df = df.sort_values('date')
     
-    # 按动作类型分组
-    colors = {
-        "涨了舍得卖": "#FF6B6B",
-        "跌了敢买": "#4ECDC4",
-        "涨了敢买": "#FFE66D",
-        "跌了舍得卖": "#95E1D3"
-    }
-    
-    fig = go.Figure()
-    
+    traces = []
+
     for action_type in ACTION_TYPES.keys():
-        action_df = df[df['action_type'] == action_type]
+        action_df = _downsample(df[df['action_type'] == action_type], 'date')
         if not action_df.empty:
-            fig.add_trace(go.Scatter(
-                x=action_df['date'],
+            traces.append(go.Scattergl(
+                x=action_df['date'].to_numpy(),
                 y=[action_type] * len(action_df),
                 mode='markers',
                 name=action_type,
                 marker=dict(
                     size=10,
-                    color=colors.get(action_type, "#000000")
+                    color=_ACTION_COLORS.get(action_type, "#000000")
                 ),
                 hovertemplate=f'<b>{action_type}</b><br>' +
                             '日期: %{x}<br>' +
@@ -337,11 +348,13 @@ def plot_trade_timeline(trades: List[Dict]) -> go.Figure:
                 customdata=action_df[['stock_name', 'stock_code', 'buy_price']].values if 'buy_price' in action_df.columns else action_df[['stock_name', 'stock_code', 'price']].values
             ))
     
+    fig = go.Figure(data=traces)
     fig.update_layout(
         title="交易记录时间线",
         xaxis_title="日期",
         yaxis_title="动作类型",
-        height=400
+        height=400,
+        uirevision='keep'
     )
     
     return fig